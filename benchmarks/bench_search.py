@@ -0,0 +1,78 @@
+# Compares the old linear substring scan with the indexed and ranked catalog searches.
+# Usage: python benchmarks/bench_search.py [file_count]
+import os
+import random
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('BOT_TOKEN', '123456:ABCDEF')
+os.environ.setdefault('DB_CHANNEL_1', '-1001')
+os.environ.setdefault('ADMIN_USER_IDS', '1')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(tempfile.mkdtemp())
+
+import bot  # noqa: E402
+
+SHOWS = ["naruto", "naruto shippuden", "one piece", "bleach", "attack on titan", "demon slayer",
+         "jujutsu kaisen", "my hero academia", "death note", "fullmetal alchemist", "hunter x hunter",
+         "black clover", "dragon ball super", "tokyo revengers", "spy x family", "chainsaw man"]
+QUALITIES = ["480p", "720p", "1080p", "2160p"]
+LANGS = ["tamil", "telugu", "hindi", "english", "japanese"]
+QUERIES = ["naruto", "naruto s01e05", "narutoo", "atack on titan", "one piece 1080p", "chainsaw", "x", "zzzz"]
+# (query, title every top hit must contain, episode code that must lead the hits carrying it)
+RANKING_CHECKS = [("naruto s01e05", "naruto", "s01e05"), ("atack on titan s02e05", "attack on titan", "s02e05")]
+
+def build_catalog(count: int):
+    random.seed(7)
+    catalog = bot.FileCatalog(os.devnull)
+    for message_id in range(count):
+        name = (f"{random.choice(SHOWS).title()} S{random.randint(1, 9):02d}E{random.randint(1, 500):02d} "
+                f"{random.choice(QUALITIES)} {random.choice(LANGS)}.mkv")
+        catalog.add({'chat_id': -1001, 'message_id': message_id, 'file_id': f"id{message_id}", 'file_name': name})
+    return catalog
+
+def linear_scan(entries: list, query: str, limit: int) -> list:
+    # The pre-index implementation: lowercase substring test over every file
+    query = query.lower()
+    matches = [entry for entry in entries if query in entry['file_name'].lower()]
+    return sorted(matches, key=lambda entry: entry['file_name'].lower())[:limit]
+
+def timed(func, *args, repeat: int = 5) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+def check_ranking(catalog, limit: int) -> bool:
+    passed = True
+    for query, title, code in RANKING_CHECKS:
+        names = [entry['file_name'].lower() for _, entry in catalog.ranked_search(query, limit)]
+        with_code = [code in name for name in names]
+        # Files carrying the code come first, and no other title outranks a title match
+        ok = all(title in name for name in names) and with_code == sorted(with_code, reverse=True)
+        passed = passed and ok
+        print(f"ranking '{query}': {'ok' if ok else 'FAILED'} ({sum(with_code)} of {len(names)} hits carry {code})")
+    return passed
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    start = time.perf_counter()
+    catalog = build_catalog(count)
+    print(f"indexed {count} files in {time.perf_counter() - start:.1f}s")
+    limit = bot.SEARCH_RESULT_LIMIT
+    print(f"{'query':<20} {'linear ms':>10} {'substring ms':>13} {'ranked ms':>10}  top ranked hit")
+    for query in QUERIES:
+        linear = timed(linear_scan, catalog.entries, query, limit)
+        substring = timed(catalog.search, query, limit)
+        ranked = timed(catalog.ranked_search, query, limit)
+        hits = catalog.ranked_search(query, limit)
+        top = hits[0][1]['file_name'] if hits else '-'
+        print(f"{query:<20} {linear:>10.2f} {substring:>13.2f} {ranked:>10.2f}  {top}")
+    if not check_ranking(catalog, 10):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+# Local aiohttp stand-ins for the Telegram Bot API and the gplinks shortener, so bot.py
+# can be load-tested without network access. Both support latency and error injection.
+import asyncio
+import itertools
+import json
+import random
+import time
+from abc import ABC, abstractmethod
+from collections import defaultdict
+
+from aiohttp import web
+
+class FakeService(ABC):
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.calls = defaultdict(int)
+        self.errors = defaultdict(int)
+        self._runner = None
+
+    async def delay(self):
+        latency = self.latency + random.uniform(0, self.jitter)
+        if latency > 0:
+            await asyncio.sleep(latency)
+
+    def fail(self) -> bool:
+        return self.error_rate > 0 and random.random() < self.error_rate
+
+    @abstractmethod
+    def app(self) -> web.Application:
+        ...
+
+    async def start(self, port: int):
+        self._runner = web.AppRunner(self.app())
+        await self._runner.setup()
+        await web.TCPSite(self._runner, '127.0.0.1', port).start()
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+class FakeBotAPI(FakeService):
+    # Answers every Bot API method with a plausible result. Channel history is exposed the way
+    # bot.py reads it, through forwardMessage, listing `channel_files` documents.
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 flood_rate: float = 0.0, channel_files: list = ()):
+        super().__init__(latency, jitter, error_rate)
+        self.flood_rate = flood_rate
+        self.channel_files = list(channel_files)
+        self._message_ids = itertools.count(1)
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_route('*', '/bot{token}/{method}', self.handle)
+        return app
+
+    async def handle(self, request):
+        method = request.match_info['method']
+        self.calls[method] += 1
+        params = dict(request.query)
+        if request.content_type == 'application/json':
+            params.update(await request.json())
+        elif request.body_exists:
+            params.update(await request.post())
+        await self.delay()
+
+        roll = random.random()
+        if roll < self.flood_rate:
+            self.errors[method] += 1
+            return web.json_response({'ok': False, 'error_code': 429, 'description': 'Too Many Requests: retry after 1',
+                                      'parameters': {'retry_after': 1}}, status=429)
+        if roll < self.flood_rate + self.error_rate:
+            self.errors[method] += 1
+            return web.json_response({'ok': False, 'error_code': 500, 'description': 'Internal Server Error'}, status=500)
+
+        api = getattr(self, f"api_{method}", None)
+        result = api(params) if api else True
+        if result is None:
+            self.errors[method] += 1
+            return web.json_response({'ok': False, 'error_code': 400, 'description': 'Bad Request: message not found'}, status=400)
+        return web.json_response({'ok': True, 'result': result})
+
+    @staticmethod
+    def user(user_id: int, is_bot: bool = False) -> dict:
+        return {'id': user_id, 'is_bot': is_bot, 'first_name': f"User{user_id}"}
+
+    def message(self, params: dict, **fields) -> dict:
+        chat_id = int(params.get('chat_id', 0))
+        message = {'message_id': next(self._message_ids), 'date': int(time.time()),
+                   'chat': {'id': chat_id, 'type': 'private' if chat_id > 0 else 'channel'}}
+        message.update(fields)
+        return message
+
+    def api_getMe(self, params: dict) -> dict:
+        return dict(self.user(123456, is_bot=True), username='bench_bot')
+
+    def api_getChatMember(self, params: dict) -> dict:
+        return {'status': 'member', 'user': self.user(int(params.get('user_id', 0)))}
+
+    def api_sendMessage(self, params: dict) -> dict:
+        return self.message(params, text=params.get('text', ''))
+
+    def api_editMessageText(self, params: dict) -> dict:
+        return self.message(params, text=params.get('text', ''))
+
+    def api_sendPhoto(self, params: dict) -> dict:
+        return self.message(params, photo=[{'file_id': 'photo', 'file_unique_id': 'photo', 'width': 1, 'height': 1}])
+
+    def api_sendVideo(self, params: dict) -> dict:
+        return self.message(params, video={'file_id': 'video', 'file_unique_id': 'video', 'width': 1, 'height': 1, 'duration': 1})
+
+    def api_sendDocument(self, params: dict) -> dict:
+        return self.message(params, document={'file_id': 'document', 'file_unique_id': 'document'})
+
+    def api_forwardMessage(self, params: dict):
+        message_id = int(params.get('message_id', 0))
+        if not 1 <= message_id <= len(self.channel_files):
+            return None
+        file_name = self.channel_files[message_id - 1]
+        return self.message(params, document={'file_id': f"doc{message_id}", 'file_unique_id': f"doc{message_id}",
+                                              'file_name': file_name})
+
+class FakeGplinks(FakeService):
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get('/api', self.handle)
+        return app
+
+    async def handle(self, request):
+        self.calls['shorten'] += 1
+        await self.delay()
+        if self.fail():
+            self.errors['shorten'] += 1
+            return web.Response(status=500, text=json.dumps({'status': 'error'}))
+        return web.Response(text=f"https://gplinks.test/{request.query.get('alias', 'x')}")
@@ -0,0 +1,247 @@
+"""Offline load test for bot.py.
+
+Runs bot.main() against the fake Bot API and gplinks servers in fake_servers.py, drives the
+webhook with synthetic updates at a fixed rate, then runs a broadcast, and reports throughput
+and p50/p95/p99 latency per handler.
+
+Usage: python benchmarks/loadtest.py --rate 20 --duration 10 [--json report.json] [--max-p95 1.0]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import socket
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+from aiohttp import ClientSession, TCPConnector
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_servers import FakeBotAPI, FakeGplinks  # noqa: E402
+
+SHOWS = ["naruto", "naruto shippuden", "boruto", "one piece", "bleach", "attack on titan", "demon slayer"]
+ADMIN_ID = 1
+LOG_CHANNEL_ID = -100999
+DB_CHANNEL_ID = -100111
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def percentile(samples: list, fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else 0.0
+
+def summarize(samples: list) -> dict:
+    return {'count': len(samples), 'p50': percentile(samples, 0.50), 'p95': percentile(samples, 0.95),
+            'p99': percentile(samples, 0.99), 'max': max(samples, default=0.0)}
+
+def file_names(count: int) -> list:
+    rng = random.Random(7)
+    return [f"{rng.choice(SHOWS).title()} S{rng.randint(1, 9):02d}E{rng.randint(1, 500):03d} "
+            f"{rng.choice(['480p', '720p', '1080p'])}.mkv" for _ in range(count)]
+
+def message_update(update_id: int, user_id: int, text: str) -> dict:
+    message = {'message_id': update_id, 'date': int(time.time()), 'text': text,
+               'chat': {'id': user_id, 'type': 'private'},
+               'from': {'id': user_id, 'is_bot': False, 'first_name': f"User{user_id}"}}
+    if text.startswith('/'):
+        message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+    return {'update_id': update_id, 'message': message}
+
+def inline_update(update_id: int, user_id: int, query: str) -> dict:
+    return {'update_id': update_id, 'inline_query': {
+        'id': str(update_id), 'query': query, 'offset': '',
+        'from': {'id': user_id, 'is_bot': False, 'first_name': f"User{user_id}"}}}
+
+def synthetic_update(update_id: int, user_id: int, scenario: str, total_episodes: int) -> dict:
+    if scenario == 'start':
+        return message_update(update_id, user_id, '/start')
+    if scenario == 'episode':
+        return message_update(update_id, user_id, f"/episode {random.randint(1, total_episodes)}")
+    if scenario == 'search':
+        return message_update(update_id, user_id, random.choice(SHOWS))
+    return inline_update(update_id, user_id, random.choice(SHOWS))
+
+def parse_mix(text: str) -> list:
+    scenarios = []
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        scenarios.extend([name.strip()] * int(weight or 1))
+    return scenarios
+
+async def drive_webhook(url: str, args, total_episodes: int) -> tuple:
+    scenarios = parse_mix(args.mix)
+    acks = []
+    statuses = defaultdict(int)
+    count = int(args.rate * args.duration)
+    start = time.perf_counter()
+
+    async with ClientSession(connector=TCPConnector(limit=0)) as session:
+        async def post(update: dict):
+            sent = time.perf_counter()
+            async with session.post(url, json=update) as response:
+                statuses[response.status] += 1
+            acks.append(time.perf_counter() - sent)
+
+        tasks = []
+        for i in range(count):
+            delay = start + i / args.rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            user_id = 10_000 + random.randrange(args.users)
+            tasks.append(asyncio.create_task(post(synthetic_update(i + 1, user_id, random.choice(scenarios), total_episodes))))
+        await asyncio.gather(*tasks)
+    return acks, statuses, time.perf_counter() - start
+
+async def run(args) -> dict:
+    telegram_port, gplinks_port, bot_port = free_port(), free_port(), free_port()
+    os.environ.update({
+        'BOT_TOKEN': '123456:BENCH',
+        'LOG_CHANNEL_ID': str(LOG_CHANNEL_ID),
+        'DB_CHANNEL_1': str(DB_CHANNEL_ID),
+        'ADMIN_USER_IDS': str(ADMIN_ID),
+        'GPLINK_API': 'bench',
+        'PORT': str(bot_port),
+        'WEBHOOK_URL': f"http://127.0.0.1:{bot_port}",
+        'TELEGRAM_API_URL': f"http://127.0.0.1:{telegram_port}/bot",
+        'GPLINKS_API_URL': f"http://127.0.0.1:{gplinks_port}/api",
+    })
+    if args.send_rate:
+        os.environ['GLOBAL_SEND_RATE'] = str(args.send_rate)
+    os.chdir(tempfile.mkdtemp(prefix='loadtest-'))
+
+    names = file_names(args.files)
+    telegram = FakeBotAPI(args.api_latency, args.api_jitter, args.api_error_rate, args.api_flood_rate, names)
+    gplinks = FakeGplinks(args.gplinks_latency, args.gplinks_jitter, args.gplinks_error_rate)
+    await telegram.start(telegram_port)
+    await gplinks.start(gplinks_port)
+
+    import bot
+    for name in ('bot', 'httpx', 'telegram', 'aiohttp.access'):
+        logging.getLogger(name).setLevel(args.log_level)
+    # Keep every handler latency, not just the histogram buckets, for exact percentiles
+    handler_samples = defaultdict(list)
+    observe = bot.handler_seconds.observe
+
+    def record(value: float, *label_values):
+        handler_samples[label_values[0]].append(value)
+        observe(value, *label_values)
+    bot.handler_seconds.observe = record
+
+    catalog = bot.file_catalogs[DB_CHANNEL_ID]
+    for message_id, name in enumerate(names, 1):
+        catalog.add({'chat_id': DB_CHANNEL_ID, 'message_id': message_id, 'file_id': f"doc{message_id}",
+                     'file_name': name, 'kind': 'document'})
+
+    main_task = asyncio.create_task(bot.main())
+    while not telegram.calls['setWebhook']:
+        if main_task.done():
+            raise RuntimeError("bot.main() exited during startup")
+        await asyncio.sleep(0.05)
+
+    acks, statuses, drive_seconds = await drive_webhook(os.environ['WEBHOOK_URL'] + '/', args, bot.TOTAL_EPISODES)
+    accepted = statuses.get(200, 0)
+    drained_from = time.perf_counter()
+    deadline = drained_from + args.drain_timeout
+    while sum(map(len, handler_samples.values())) < accepted and time.perf_counter() < deadline:
+        await asyncio.sleep(0.05)
+    traffic_seconds = drive_seconds + time.perf_counter() - drained_from
+
+    broadcast = {}
+    if args.broadcast:
+        bot.users.update(range(1_000_000, 1_000_000 + args.broadcast))
+        job = bot.BroadcastJob(str(ADMIN_ID), ADMIN_ID, {'text': 'load test', 'photo': None, 'video': None},
+                               list(range(1_000_000, 1_000_000 + args.broadcast)))
+        job.progress_message_id = (await bot.dispatch(bot.bot_app.bot.send_message, chat_id=ADMIN_ID, text='...')).message_id
+        started = time.perf_counter()
+        await bot.run_broadcast(bot.bot_app.bot, job)
+        elapsed = time.perf_counter() - started
+        broadcast = {'messages': len(job.targets), 'seconds': elapsed, 'per_second': len(job.targets) / elapsed,
+                     'succeeded': job.success_count, 'failed': job.fail_count}
+
+    main_task.cancel()
+    try:
+        await main_task
+    except (asyncio.CancelledError, SystemExit):
+        pass
+    await bot.bot_app.stop()
+    await bot.bot_app.shutdown()
+    await telegram.stop()
+    await gplinks.stop()
+
+    handled = sum(map(len, handler_samples.values()))
+    return {
+        'config': {key: value for key, value in vars(args).items() if key != 'json'},
+        'updates': {'sent': len(acks), 'statuses': dict(statuses), 'handled': handled,
+                    'seconds': traffic_seconds, 'per_second': handled / traffic_seconds},
+        'webhook_ack': summarize(acks),
+        'handlers': {name: summarize(samples) for name, samples in sorted(handler_samples.items())},
+        'broadcast': broadcast,
+        'telegram_calls': dict(telegram.calls),
+        'telegram_errors': dict(telegram.errors),
+        'gplinks_calls': dict(gplinks.calls),
+        'gplinks_errors': dict(gplinks.errors),
+    }
+
+def print_report(report: dict):
+    updates = report['updates']
+    print(f"\nupdates: sent={updates['sent']} handled={updates['handled']} statuses={updates['statuses']} "
+          f"throughput={updates['per_second']:.1f}/s")
+    print(f"{'':<20} {'count':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    rows = [('webhook ack', report['webhook_ack'])] + list(report['handlers'].items())
+    for name, stats in rows:
+        print(f"{name:<20} {stats['count']:>7} {stats['p50'] * 1000:>9.1f} {stats['p95'] * 1000:>9.1f} "
+              f"{stats['p99'] * 1000:>9.1f} {stats['max'] * 1000:>9.1f}")
+    if report['broadcast']:
+        broadcast = report['broadcast']
+        print(f"broadcast: {broadcast['messages']} messages in {broadcast['seconds']:.1f}s "
+              f"({broadcast['per_second']:.1f}/s, {broadcast['failed']} failed)")
+    print(f"telegram calls: {report['telegram_calls']} errors: {report['telegram_errors']}")
+    print(f"gplinks calls: {report['gplinks_calls']} errors: {report['gplinks_errors']}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rate', type=float, default=20, help='webhook updates per second')
+    parser.add_argument('--duration', type=float, default=10, help='seconds of traffic')
+    parser.add_argument('--users', type=int, default=5000, help='distinct synthetic users')
+    parser.add_argument('--mix', default='start=1,episode=1,search=2,inline=1', help='scenario weights')
+    parser.add_argument('--files', type=int, default=10000, help='files in the synthetic DB channel')
+    parser.add_argument('--broadcast', type=int, default=500, help='broadcast recipients, 0 to skip')
+    parser.add_argument('--send-rate', type=int, default=0, help='override GLOBAL_SEND_RATE')
+    parser.add_argument('--api-latency', type=float, default=0.03)
+    parser.add_argument('--api-jitter', type=float, default=0.02)
+    parser.add_argument('--api-error-rate', type=float, default=0.0)
+    parser.add_argument('--api-flood-rate', type=float, default=0.0, help='fraction of calls answered with 429')
+    parser.add_argument('--gplinks-latency', type=float, default=0.15)
+    parser.add_argument('--gplinks-jitter', type=float, default=0.1)
+    parser.add_argument('--gplinks-error-rate', type=float, default=0.0)
+    parser.add_argument('--drain-timeout', type=float, default=60, help='seconds to wait for queued updates')
+    parser.add_argument('--log-level', default='WARNING', help="log level for the bot's own logging")
+    parser.add_argument('--json', help='write the report to this file')
+    parser.add_argument('--max-p95', type=float, help='exit 1 if any handler p95 exceeds this many seconds')
+    args = parser.parse_args()
+    if args.json:
+        args.json = os.path.abspath(args.json)
+
+    report = asyncio.run(run(args))
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.max_p95 is not None:
+        slow = [name for name, stats in report['handlers'].items() if stats['p95'] > args.max_p95]
+        if slow or report['updates']['handled'] < report['updates']['sent']:
+            print(f"FAILED: p95 above {args.max_p95}s for {slow or 'none'}, "
+                  f"{report['updates']['sent'] - report['updates']['handled']} updates unhandled")
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,221 @@
+# Micro-benchmarks for bot.py hot paths: catalog search, episode lookup, season generation,
+# settings and user persistence, and keyboard construction. Results are written as JSON so a
+# baseline can be committed and compared in review.
+# Cases are timed timeit-style, with a calibrated number of calls per round and the fastest round as
+# the figure of record. Each group's cases run interleaved over several passes together with a fixed
+# reference workload. A comparison scales every case by its group's reference, which factors out the
+# machine running faster or slower as a whole. It flags a case only when the slowdown clears both
+# --fail-above and the spread between that case's passes, the latter capped at NOISE_CEILING.
+# Usage:
+#   python benchmarks/microbench.py --save benchmarks/baseline.json
+#   python benchmarks/microbench.py --compare benchmarks/baseline.json [--fail-above 0.25]
+# The 1M-file catalog needs about 3GB of memory and a minute to build; use --sizes to skip it.
+import argparse
+import asyncio
+import functools
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import timeit
+
+os.environ.setdefault('BOT_TOKEN', '123456:ABCDEF')
+os.environ.setdefault('DB_CHANNEL_1', '-1001')
+os.environ.setdefault('ADMIN_USER_IDS', '1')
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# bot.py reads and writes its state files in the working directory
+INVOKED_FROM = os.getcwd()
+os.chdir(tempfile.mkdtemp(prefix='microbench-'))
+
+import bot  # noqa: E402
+from bench_search import build_catalog  # noqa: E402
+
+SEARCH_QUERIES = ["naruto", "naruto s01e05", "atack on titan", "one piece 1080p", "zzzz"]
+ROUND_TIME = 0.02  # seconds per round; fast cases repeat within a round until it takes this long
+PASSES = 5  # each pass times every case of a group once, so drift hits all of them alike
+ROUNDS_PER_PASS = 3
+NOISE_FACTOR = 1.5  # a slowdown must also exceed this many times the spread between passes
+NOISE_CEILING = 0.25  # up to this much, so a noisy case cannot hide a large slowdown
+REFERENCE_DATA = list(range(20000, 0, -1))
+
+def reference_workload():
+    # Pure-Python sorting and hashing, timed in every group to track the machine's speed
+    return len({value % 977 for value in sorted(REFERENCE_DATA, key=str)})
+
+def calibrate(timer: timeit.Timer) -> int:
+    loops = 1
+    elapsed = timer.timeit(loops)
+    while elapsed < ROUND_TIME:
+        loops = max(loops * 2, int(loops * ROUND_TIME / max(elapsed, 1e-9) * 1.2))
+        elapsed = timer.timeit(loops)
+    return loops
+
+def measure_group(cases: dict) -> dict:
+    # Interleaves the group's cases pass by pass instead of timing each one to completion
+    cases = dict(cases, reference=reference_workload)
+    timers = {}
+    for name, func in cases.items():
+        func()  # warm-up: first calls build lazy caches such as the catalog's name order
+        timer = timeit.Timer(func)
+        timers[name] = (timer, calibrate(timer))
+    passes = {name: [] for name in cases}
+    for _ in range(PASSES):
+        for name, (timer, loops) in timers.items():
+            passes[name].append([total / loops for total in timer.repeat(ROUNDS_PER_PASS, loops)])
+    stats = {}
+    for name, rounds in passes.items():
+        pass_mins = [min(times) for times in rounds]
+        per_call = [time for times in rounds for time in times]
+        stats[name] = {'min_s': min(pass_mins), 'median_s': statistics.median(per_call),
+                       'spread': (max(pass_mins) - min(pass_mins)) / min(pass_mins),
+                       'loops': timers[name][1], 'rounds': len(per_call)}
+    reference = stats.pop('reference')
+    for case in stats.values():
+        case['reference_s'] = reference['min_s']
+    return stats
+
+def relative(stats: dict) -> float:
+    return stats['min_s'] / stats['reference_s']
+
+def bench_search(loop, size: int) -> dict:
+    channel_id = bot.DB_CHANNELS[0]
+    bot.file_catalogs[channel_id] = build_catalog(size)
+
+    def cold(mode: str, query: str):
+        bot.SEARCH_MODE = mode
+        bot.search_cache.clear()
+        loop.run_until_complete(bot.search_file_in_channel(None, query, 0))
+
+    def cached():
+        bot.SEARCH_MODE = 'ranked'
+        loop.run_until_complete(bot.search_file_in_channel(None, "naruto", 0))
+    cases = {f"search.{mode}[{size}]['{query}']": functools.partial(cold, mode, query)
+             for mode in ('ranked', 'substring') for query in SEARCH_QUERIES}
+    cases[f"search.cached[{size}]"] = cached
+    return cases
+
+def bench_episodes(total: int) -> dict:
+    bot.TOTAL_EPISODES = total
+    season_data = bot.generate_season_data()
+    numbers = [random.randint(1, total) for _ in range(1000)]
+    return {
+        f"generate_season_data[{total}]": bot.generate_season_data,
+        f"episode_index.rebuild[{total}]": lambda: bot.episode_index.rebuild(season_data),
+        f"find_episode[{total}] x1000": lambda: [bot.find_episode(n) for n in numbers],
+        f"find_episode_range[{total}]": lambda: bot.find_episode_range(total // 2, total // 2 + bot.MAX_EPISODE_RANGE - 1),
+    }
+
+def bench_settings(loop, total: int) -> dict:
+    bot.TOTAL_EPISODES = total
+    settings = dict(bot.DEFAULT_SETTINGS, season_data=bot.generate_season_data())
+
+    def save(seasons: bool):
+        # Flush only the writers the save scheduled, as the debounce timer would
+        bot.save_settings(settings, seasons=seasons)
+        loop.run_until_complete(bot.settings_repository.ui_writer.flush())
+        if seasons:
+            loop.run_until_complete(bot.settings_repository.seasons_writer.flush())
+    return {
+        f"save_settings[{total}]": functools.partial(save, False),
+        f"save_settings(seasons)[{total}]": functools.partial(save, True),
+        f"load_settings[{total}]": bot.load_settings,
+    }
+
+def bench_users(loop, count: int) -> dict:
+    user_ids = set(range(1, count + 1))
+    bot.user_store.compact(user_ids)
+    return {
+        f"load_users[{count}]": bot.load_users,
+        f"save_users[{count}] +1": lambda: loop.run_until_complete(bot.save_users([count + 1])),
+        f"user_store.compact[{count}]": lambda: bot.user_store.compact(user_ids),
+    }
+
+def bench_keyboards() -> dict:
+    bot.invalidate_render_cache()
+    return {
+        "build_pagination_keyboard": lambda: bot.build_pagination_keyboard(3, 5),
+        "build_season_selection_keyboard": lambda: bot.build_season_selection_keyboard('edit'),
+        # Cache hits take well under a microsecond, so each is timed as a batch of 1000
+        "create_pagination_keyboard (cached) x1000": lambda: [bot.create_pagination_keyboard(3, 5) for _ in range(1000)],
+        "create_main_menu_keyboard (cached) x1000": lambda: [bot.create_main_menu_keyboard() for _ in range(1000)],
+    }
+
+def compare(results: dict, baseline: dict, fail_above: float) -> bool:
+    # Compares the fastest rounds, which are the least disturbed by the rest of the machine, each
+    # relative to the reference workload timed alongside it
+    regressed = False
+    print(f"\n{'benchmark':<55} {'baseline':>12} {'now':>12} {'change':>8} {'noise':>7}")
+    for name, stats in results.items():
+        before = baseline.get('results', {}).get(name)
+        if not before:
+            print(f"{name:<55} {'-':>12} {stats['min_s'] * 1000:>10.4f}ms {'new':>8}")
+            continue
+        change = relative(stats) / relative(before) - 1
+        noise = min(NOISE_FACTOR * max(before['spread'], stats['spread']), NOISE_CEILING)
+        flag = ''
+        if fail_above is not None and change > max(fail_above, noise):
+            regressed = True
+            flag = ' !'
+        print(f"{name:<55} {before['min_s'] * 1000:>10.4f}ms {stats['min_s'] * 1000:>10.4f}ms {change:>+7.0%} {noise:>6.0%}{flag}")
+    return regressed
+
+def parse_sizes(text: str) -> list:
+    return [int(value) for value in text.split(',') if value]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='1000,100000,1000000', help='catalog sizes for search benchmarks')
+    parser.add_argument('--episodes', default='220,10000,100000', help='TOTAL_EPISODES values')
+    parser.add_argument('--users', default='10000,100000,1000000', help='user set sizes')
+    parser.add_argument('--only', help='comma-separated groups: search,episodes,settings,users,keyboards')
+    parser.add_argument('--save', help='write results to this JSON file')
+    parser.add_argument('--compare', help='baseline JSON file to compare against')
+    parser.add_argument('--fail-above', type=float,
+                        help='exit 1 if any case is slower than baseline by this fraction and by more than its noise')
+    args = parser.parse_args()
+    logging.getLogger('bot').setLevel(logging.WARNING)
+    random.seed(7)
+
+    groups = set(args.only.split(',')) if args.only else {'search', 'episodes', 'settings', 'users', 'keyboards'}
+    loop = asyncio.new_event_loop()
+    results = {}
+    if 'search' in groups:
+        for size in parse_sizes(args.sizes):
+            results.update(measure_group(bench_search(loop, size)))
+        bot.file_catalogs[bot.DB_CHANNELS[0]] = bot.FileCatalog(os.devnull)
+        bot.SEARCH_MODE = 'ranked'
+    if 'episodes' in groups:
+        for total in parse_sizes(args.episodes):
+            results.update(measure_group(bench_episodes(total)))
+    if 'settings' in groups:
+        for total in parse_sizes(args.episodes):
+            results.update(measure_group(bench_settings(loop, total)))
+    if 'users' in groups:
+        for count in parse_sizes(args.users):
+            results.update(measure_group(bench_users(loop, count)))
+    if 'keyboards' in groups:
+        results.update(measure_group(bench_keyboards()))
+    loop.close()
+
+    if not args.compare:
+        for name, stats in results.items():
+            print(f"{name:<55} {stats['min_s'] * 1000:>10.4f}ms (median {stats['median_s'] * 1000:.4f}ms, "
+                  f"spread {stats['spread']:.0%}, {stats['rounds']} rounds of {stats['loops']})")
+    report = {'meta': {'python': platform.python_version(), 'machine': platform.machine(),
+                       'created': time.strftime('%Y-%m-%dT%H:%M:%S')}, 'results': results}
+    if args.save:
+        with open(os.path.join(INVOKED_FROM, args.save), 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(os.path.join(INVOKED_FROM, args.compare)) as f:
+            if compare(results, json.load(f), args.fail_above):
+                sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -2,30 +2,51 @@
 # requirements.txt should include:
 # python-telegram-bot==20.7
 # aiohttp==3.9.5
-# aiolimiter==1.1.0
 # async-timeout==4.0.3
 
 import logging
 import asyncio
 import sys
 import os
+import signal
+import re
 import json
-from urllib.parse import urlencode
-from telegram import Bot, ReplyKeyboardMarkup, Update, InlineKeyboardButton, InlineKeyboardMarkup
+import heapq
+import itertools
+import bisect
+import threading
+import functools
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode, urlparse
+from telegram import (
+    Bot,
+    ReplyKeyboardMarkup,
+    Update,
+    InlineKeyboardButton,
+    InlineKeyboardMarkup,
+    InlineQueryResultCachedAudio,
+    InlineQueryResultCachedDocument,
+    InlineQueryResultCachedPhoto,
+    InlineQueryResultCachedVideo,
+    InlineQueryResultsButton,
+)
 from telegram.ext import (
     Application,
+    BaseUpdateProcessor,
     CommandHandler,
     ContextTypes,
     MessageHandler,
     filters,
     CallbackQueryHandler,
+    ChatMemberHandler,
+    InlineQueryHandler,
 )
-from telegram.error import TelegramError
-from collections import defaultdict
+from telegram.error import Forbidden, RetryAfter, TelegramError
+from collections import OrderedDict, defaultdict, deque
 import time
-from aiohttp import ClientSession, web
+from aiohttp import ClientSession, ClientTimeout, TCPConnector, web
 import math
-import aiolimiter
 from async_timeout import timeout
 
 # Configure logging
@@ -39,69 +60,930 @@ logger = logging.getLogger(__name__)
 BOT_TOKEN = os.getenv('BOT_TOKEN', 'YOUR_BOT_TOKEN')
 LOG_CHANNEL_ID = os.getenv('LOG_CHANNEL_ID', '0')
 DB_CHANNEL_1 = os.getenv('DB_CHANNEL_1', '0')
+DB_CHANNELS = os.getenv('DB_CHANNELS', '')
 ADMIN_USER_IDS = os.getenv('ADMIN_USER_IDS', '')
 GPLINK_API = os.getenv('GPLINK_API', 'YOUR_GPLINK_API')
+GPLINKS_API_URL = os.getenv('GPLINKS_API_URL', 'https://api.gplinks.com/api')
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', 'https://api.telegram.org/bot')  # a local Bot API server or a load-test stand-in
 WEBHOOK_URL = os.getenv('WEBHOOK_URL', '')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', '')
+WEBHOOK_WORKERS = int(os.getenv('WEBHOOK_WORKERS', 2))  # workers only parse and hand off updates
+WEBHOOK_QUEUE_SIZE = int(os.getenv('WEBHOOK_QUEUE_SIZE', 1000))
+UPDATE_CONCURRENCY = int(os.getenv('UPDATE_CONCURRENCY', 32))
+WEBHOOK_OVERFLOW = os.getenv('WEBHOOK_OVERFLOW', 'reject')  # 'reject' asks Telegram to redeliver, 'shed' drops the update
 PORT = int(os.getenv('PORT', 10000))
 TOTAL_EPISODES = int(os.getenv('TOTAL_EPISODES', 220))
 EPISODES_PER_SEASON = int(os.getenv('EPISODES_PER_SEASON', 25))
+MAX_EPISODE_RANGE = int(os.getenv('MAX_EPISODE_RANGE', 25))
 SEARCH_RESULT_LIMIT = int(os.getenv('SEARCH_RESULT_LIMIT', 50))
+SHARD_SEARCH_TIMEOUT = float(os.getenv('SHARD_SEARCH_TIMEOUT', 2))  # seconds per DB channel
+SEARCH_WORKERS = int(os.getenv('SEARCH_WORKERS', 4))  # threads for catalog searches, apart from the default executor
+SEARCH_MODE = os.getenv('SEARCH_MODE', 'ranked')  # 'ranked' (fuzzy, relevance order) or 'substring' (exact, name order)
+SLOW_HANDLER_THRESHOLD = float(os.getenv('SLOW_HANDLER_THRESHOLD', 2))  # seconds before a handler's spans are logged
+PROFILE_ENABLED = os.getenv('PROFILE_ENABLED', '').lower() in ('1', 'true', 'yes')
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+PROFILE_INTERVAL = float(os.getenv('PROFILE_INTERVAL', 0.01))  # seconds between stack samples
 UPDATES_CHANNEL = '@bot_paiyan_official'
 
 # Validate environment
 try:
     LOG_CHANNEL_ID = int(LOG_CHANNEL_ID)
     DB_CHANNEL_1 = int(DB_CHANNEL_1)
+    DB_CHANNELS = [int(id) for id in DB_CHANNELS.split(',') if id] if DB_CHANNELS else [DB_CHANNEL_1]
     ADMIN_USER_IDS = [str(id) for id in ADMIN_USER_IDS.split(',') if id] if ADMIN_USER_IDS else []
 except ValueError as e:
     logger.error(f"Invalid environment variable format: {e}")
     sys.exit(1)
 
 IS_LOGGING_ENABLED = LOG_CHANNEL_ID != 0 and LOG_CHANNEL_ID < 0
-IS_DB_ENABLED = DB_CHANNEL_1 != 0 and DB_CHANNEL_1 < 0
+IS_DB_ENABLED = bool(DB_CHANNELS) and all(channel_id < 0 for channel_id in DB_CHANNELS)
 
 # Initialize bot for logging
-log_bot = Bot(token=BOT_TOKEN)
+log_bot = Bot(token=BOT_TOKEN, base_url=TELEGRAM_API_URL)
 
 # Global variables
 SETTINGS_FILE = "settings.json"
+SEASONS_FILE = "seasons.json"
+UI_SETTINGS_KEYS = ('start_text', 'start_pic', 'cover_pic')
+DEFAULT_SETTINGS = {
+    'start_text': '🌟 Welcome! Choose a season or option:',
+    'start_pic': None,
+    'cover_pic': None
+}
 USERS_FILE = "users.json"
+USERS_LOG_FILE = "users.log"
+FILES_FILE = "files_{channel}.jsonl"
+LEGACY_FILES_FILE = "files.jsonl"
+SHORT_URL_CACHE_FILE = "short_urls.json"
+BROADCAST_FILE = "broadcast.json"
+BROADCAST_TARGETS_FILE = "broadcast_targets.json"
+DELETIONS_FILE = "deletions.json"
+DELETIONS_LOG_FILE = "deletions.log"
 COVER_PHOTO_ID = None
 FILES_PER_PAGE = 10
+INLINE_RESULTS_PER_PAGE = 20  # Telegram allows at most 50 results per inline answer
+INLINE_CACHE_TIME = int(os.getenv('INLINE_CACHE_TIME', 300))  # seconds Telegram may reuse an inline answer
 AUTO_DELETE_DURATION = 3600
-RATE_LIMIT = 30 / 60  # 30 requests/min
+DELETE_BATCH_SIZE = 100  # Bot API limit for deleteMessages
+DELETE_RETRY_DELAY = 60  # seconds before retrying deletions that failed on a timeout or network error
+RATE_LIMIT = 30  # 30 requests per RATE_LIMIT_WINDOW
+RATE_LIMIT_WINDOW = 60  # 1 min
 SEARCH_CACHE_DURATION = 300  # 5 min
+SEARCH_CACHE_SIZE = int(os.getenv('SEARCH_CACHE_SIZE', 1000))
+SEARCH_PAGE_CACHE_SIZE = int(os.getenv('SEARCH_PAGE_CACHE_SIZE', 5000))  # rendered (query, page) file lists
+SESSION_IDLE_TIMEOUT = int(os.getenv('SESSION_IDLE_TIMEOUT', 1800))  # 30 min
+SESSION_MAX_USERS = int(os.getenv('SESSION_MAX_USERS', 10000))
+CACHE_SWEEP_INTERVAL = 60  # seconds between expired cache sweeps
 SEARCH_TIMEOUT = 10  # 10 seconds for search
-BROADCAST_RATE_LIMIT = 30  # 30 messages per second
+SUBSCRIPTION_CACHE_TTL = int(os.getenv('SUBSCRIPTION_CACHE_TTL', 300))  # 5 min for members
+SUBSCRIPTION_NEGATIVE_TTL = int(os.getenv('SUBSCRIPTION_NEGATIVE_TTL', 30))  # 30 seconds for non-members
+SUBSCRIPTION_CACHE_SIZE = 100000
+MEMBER_STATUSES = ('member', 'administrator', 'creator')
+FILE_SENDERS = {  # catalog kind -> (Bot method, file argument)
+    'document': ('send_document', 'document'),
+    'video': ('send_video', 'video'),
+    'audio': ('send_audio', 'audio'),
+    'photo': ('send_photo', 'photo'),
+}
+GLOBAL_SEND_RATE = int(os.getenv('GLOBAL_SEND_RATE', 30))  # 30 messages per second bot-wide
+PER_CHAT_SEND_RATE = 1  # 1 message per second per chat
+PER_CHAT_SEND_BURST = 3
+OUTBOUND_CONCURRENCY = int(os.getenv('OUTBOUND_CONCURRENCY', 30))
+OUTBOUND_MAX_RETRIES = 3
+PRIORITY_INTERACTIVE = 0
+PRIORITY_DELETE = 1
+PRIORITY_BROADCAST = 2
+BROADCAST_WORKERS = int(os.getenv('BROADCAST_WORKERS', 10))
+BROADCAST_PROGRESS_INTERVAL = 5  # seconds between progress message edits
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', 20))
+HTTP_TIMEOUT = 10  # 10 seconds per gplinks request
+SHORTEN_CONCURRENCY = int(os.getenv('SHORTEN_CONCURRENCY', 5))
+SHORT_URL_CACHE_TTL = int(os.getenv('SHORT_URL_CACHE_TTL', 7 * 24 * 3600))  # 7 days
+SHORT_URL_CACHE_SIZE = int(os.getenv('SHORT_URL_CACHE_SIZE', 50000))
+PERSIST_DELAY = 5  # seconds to coalesce cache writes
+SETTINGS_SAVE_DELAY = 2  # seconds to coalesce admin edits
+FUZZY_MIN_SIMILARITY = 0.35
+FUZZY_MAX_EXPANSIONS = 8
+BM25_K1 = 1.2
+BM25_B = 0.75
+EPISODE_MATCH_BOOST = 3.0
+EPISODE_BOOST_CEILING = 0.9  # fraction of the weakest title token's score the episode boosts may reach
+INDEX_BATCH_LOG_EVERY = 500  # progress log interval for /index backfill
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)  # seconds
+PROFILE_FLUSH_INTERVAL = 60  # seconds between profile snapshots on disk
+
+# Metrics
+metrics_registry = []
+
+def format_labels(names: tuple, values: tuple) -> str:
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.values = defaultdict(float)
+        metrics_registry.append(self)
+
+    def inc(self, *label_values, amount: float = 1):
+        self.values[label_values] += amount
+
+    def render(self) -> list:
+        return [f"{self.name}{format_labels(self.labels, values)} {value}" for values, value in self.values.items()]
+
+class MetricTimer:
+    __slots__ = ('histogram', 'label_values', 'start')
+
+    def __init__(self, histogram, label_values: tuple):
+        self.histogram = histogram
+        self.label_values = label_values
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start, *self.label_values)
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name: str, help_text: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> [per-bucket counts with a trailing +Inf slot, sum, count]
+        self.series = {}
+        metrics_registry.append(self)
+
+    def observe(self, value: float, *label_values):
+        series = self.series.get(label_values)
+        if series is None:
+            series = self.series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def time(self, *label_values) -> MetricTimer:
+        return MetricTimer(self, label_values)
+
+    def render(self) -> list:
+        lines = []
+        for values, (counts, total, count) in self.series.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{format_labels(self.labels + ('le',), values + (bound,))} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.labels, values)} {total}")
+            lines.append(f"{self.name}_count{format_labels(self.labels, values)} {count}")
+        return lines
+
+class Gauge:
+    # Read from live state when scraped, so hot paths pay nothing
+    def __init__(self, name: str, help_text: str, func, labels: tuple = (), kind: str = 'gauge'):
+        self.name = name
+        self.help = help_text
+        self.func = func
+        self.labels = labels
+        self.kind = kind
+        metrics_registry.append(self)
+
+    def render(self) -> list:
+        value = self.func()
+        if not self.labels:
+            return [f"{self.name} {value}"]
+        return [f"{self.name}{format_labels(self.labels, values)} {item}" for values, item in value.items()]
+
+def render_metrics() -> str:
+    lines = []
+    for metric in metrics_registry:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+handler_seconds = Histogram('bot_handler_seconds', 'Update handler latency', ('handler',))
+handler_errors = Counter('bot_handler_errors_total', 'Update handlers that raised', ('handler',))
+gplinks_seconds = Histogram('bot_gplinks_seconds', 'gplinks API request latency')
+gplinks_requests = Counter('bot_gplinks_requests_total', 'gplinks API requests by outcome', ('result',))
+short_url_lookups = Counter('bot_short_url_lookups_total', 'Short URL cache lookups', ('result',))
+search_seconds = Histogram('bot_search_seconds', 'Catalog search latency on cache misses')
+search_lookups = Counter('bot_search_lookups_total', 'Search cache lookups', ('result',))
+subscription_lookups = Counter('bot_subscription_checks_total', 'Subscription checks by source', ('result',))
+rate_limited = Counter('bot_rate_limited_total', 'Requests rejected by the per-user rate limiter')
+broadcast_messages = Counter('bot_broadcast_messages_total', 'Broadcast deliveries by outcome', ('result',))
+
+# Tracing
+current_trace = contextvars.ContextVar('current_trace', default=None)
+
+class Trace:
+    __slots__ = ('update_id', 'handler', 'start', 'spans')
+
+    def __init__(self, update_id, handler: str):
+        self.update_id = update_id
+        self.handler = handler
+        self.start = time.perf_counter()
+        self.spans = []
+
+    def breakdown(self) -> str:
+        totals = {}
+        for name, duration in self.spans:
+            count, total = totals.get(name, (0, 0.0))
+            totals[name] = (count + 1, total + duration)
+        ordered = sorted(totals.items(), key=lambda item: -item[1][1])
+        return ", ".join(f"{name}={total * 1000:.0f}ms" + (f" x{count}" if count > 1 else "")
+                         for name, (count, total) in ordered)
+
+class Span:
+    # Times an awaited external call into the current update's trace; a no-op outside handlers
+    __slots__ = ('name', 'trace', 'start')
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.trace = current_trace.get()
+        if self.trace is not None:
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.trace is not None:
+            self.trace.spans.append((self.name, time.perf_counter() - self.start))
+
+def instrumented(handler):
+    name = handler.__name__
+
+    @functools.wraps(handler)
+    async def wrapper(update, context):
+        trace = Trace(getattr(update, 'update_id', None), name)
+        token = current_trace.set(trace)
+        try:
+            return await handler(update, context)
+        except Exception:
+            handler_errors.inc(name)
+            raise
+        finally:
+            current_trace.reset(token)
+            elapsed = time.perf_counter() - trace.start
+            handler_seconds.observe(elapsed, name)
+            if elapsed >= SLOW_HANDLER_THRESHOLD:
+                logger.warning(f"Slow update {trace.update_id}: {name} took {elapsed * 1000:.0f}ms "
+                               f"({trace.breakdown() or 'no external calls'})")
+    return wrapper
+
+class SamplingProfiler:
+    # Samples the event loop thread's stack from a timer thread and writes collapsed stacks,
+    # one "frame;frame;frame count" line per stack, for flamegraph.pl or speedscope
+    def __init__(self, directory: str, interval: float):
+        self.directory = directory
+        self.interval = interval
+        self.samples = defaultdict(int)
+        self.path = None
+        self._target = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> str:
+        # Must be called from the event loop thread, which is the one sampled
+        if self.running:
+            return self.path
+        os.makedirs(self.directory, exist_ok=True)
+        self.samples = defaultdict(int)
+        self.path = os.path.join(self.directory, f"profile-{int(time.time())}.folded")
+        self._target = threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+        logger.info(f"Sampling profiler started, writing to {self.path}")
+        return self.path
+
+    async def stop(self):
+        if not self.running:
+            return None
+        self._stop.set()
+        await asyncio.get_running_loop().run_in_executor(None, self._thread.join)
+        logger.info(f"Sampling profiler stopped, {sum(self.samples.values())} samples in {self.path}")
+        return self.path
+
+    def _run(self):
+        last_flush = time.monotonic()
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+            if time.monotonic() - last_flush >= PROFILE_FLUSH_INTERVAL:
+                self._write()
+                last_flush = time.monotonic()
+        self._write()
+
+    def _write(self):
+        try:
+            write_atomic(self.path, "".join(f"{stack} {count}\n" for stack, count in list(self.samples.items())))
+        except OSError as e:
+            logger.error(f"Failed to write profile {self.path}: {e}")
+
+profiler = SamplingProfiler(PROFILE_DIR, PROFILE_INTERVAL)
+
+# User store
+class UserStore:
+    # Append-only log of user IDs; a "-" prefix records a removal
+    def __init__(self, log_path: str, legacy_path: str):
+        self.log_path = log_path
+        self.legacy_path = legacy_path
+        self._lock = threading.Lock()
+
+    def load(self) -> set:
+        user_ids = set()
+        line_count = 0
+        try:
+            with open(self.log_path, 'r') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    line_count += 1
+                    try:
+                        if line.startswith('-'):
+                            user_ids.discard(int(line[1:]))
+                        else:
+                            user_ids.add(int(line))
+                    except ValueError:
+                        logger.warning(f"Skipping invalid line in {self.log_path}: {line!r}")
+        except FileNotFoundError:
+            user_ids = self._load_legacy()
+            if user_ids:
+                self.compact(user_ids)
+            return user_ids
+        if line_count > 2 * len(user_ids) + 1000:
+            self.compact(user_ids)
+        return user_ids
+
+    def _load_legacy(self) -> set:
+        try:
+            with open(self.legacy_path, 'r') as f:
+                user_ids = {int(user_id) for user_id in json.load(f)}
+                logger.info(f"Migrating {len(user_ids)} users from {self.legacy_path} to {self.log_path}")
+                return user_ids
+        except (FileNotFoundError, json.JSONDecodeError, TypeError, ValueError):
+            return set()
+
+    def compact(self, user_ids):
+        with self._lock:
+            write_atomic(self.log_path, "".join(f"{user_id}\n" for user_id in user_ids))
+
+    def _append(self, lines: list):
+        with self._lock:
+            append_lines(self.log_path, lines)
+
+    async def append(self, lines: list):
+        await asyncio.get_running_loop().run_in_executor(None, self._append, lines)
+
+def write_atomic(path: str, data: str):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def append_lines(path: str, lines: list):
+    with open(path, 'a') as f:
+        f.write("".join(f"{line}\n" for line in lines))
+        f.flush()
+        os.fsync(f.fileno())
+
+class DebouncedWriter:
+    # Coalesces bursts of changes into one atomic JSON write from a thread executor
+    def __init__(self, path: str, snapshot, delay: float = PERSIST_DELAY):
+        self.path = path
+        self.snapshot = snapshot
+        self.delay = delay
+        self._task = None
+
+    def _write(self, data):
+        write_atomic(self.path, json.dumps(data, separators=(',', ':'), ensure_ascii=False))
+
+    def schedule(self):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._write(self.snapshot())
+            return
+        if self._task is None or self._task.done():
+            self._task = loop.create_task(self._delayed_write())
+
+    async def _delayed_write(self):
+        await asyncio.sleep(self.delay)
+        self._task = None
+        await self.write_now()
 
-# Rate limiter and search cache
-rate_limiters = defaultdict(lambda: aiolimiter.AsyncLimiter(RATE_LIMIT, 60))
-broadcast_limiter = aiolimiter.AsyncLimiter(BROADCAST_RATE_LIMIT, 1)
-search_cache = {}
+    async def write_now(self):
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self._write, self.snapshot())
+        except Exception as e:
+            logger.error(f"Failed to save {self.path}: {e}")
+            if IS_LOGGING_ENABLED:
+                asyncio.create_task(send_log_message(f"Failed to save {self.path}: {e}"))
+
+    async def flush(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+        self._task = None
+        await self.write_now()
+
+class TTLCache:
+    # LRU-ordered mapping whose entries also expire after a time-to-live
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        item = self._data.get(key)
+        if item is None:
+            return default
+        if item[0] <= time.time():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return item[1]
+
+    def set(self, key, value, ttl: float = None):
+        self._data[key] = (time.time() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        item = self._data.pop(key, None)
+        return default if item is None else item[1]
+
+    def clear(self):
+        self._data.clear()
+
+    def expire(self) -> int:
+        now = time.time()
+        expired = [key for key, (expires_at, _) in self._data.items() if expires_at <= now]
+        for key in expired:
+            del self._data[key]
+        return len(expired)
+
+    def dump(self) -> list:
+        return [[key, expires_at, value] for key, (expires_at, value) in self._data.items()]
+
+    def restore(self, items: list):
+        now = time.time()
+        for key, expires_at, value in items:
+            if expires_at > now:
+                self.set(key, value, expires_at - now)
+
+user_store = UserStore(USERS_LOG_FILE, USERS_FILE)
 
 # Load users
 def load_users():
+    users = user_store.load()
+    logger.info(f"Loaded {len(users)} users from {USERS_LOG_FILE}")
+    return users
+
+async def save_users(new_user_ids, removed_user_ids=()):
+    lines = [str(user_id) for user_id in new_user_ids] + [f"-{user_id}" for user_id in removed_user_ids]
+    if not lines:
+        return
     try:
-        with open(USERS_FILE, 'r') as f:
-            users = json.load(f)
-            logger.info(f"Loaded {len(users)} users from users.json")
-            return set(users)
-    except (FileNotFoundError, json.JSONDecodeError):
-        logger.warning("users.json not found or invalid, starting with empty user list")
-        return set()
-
-def save_users(users):
-    try:
-        with open(USERS_FILE, 'w') as f:
-            json.dump(list(users), f, indent=4)
-        logger.info("Saved users to users.json")
+        await user_store.append(lines)
     except Exception as e:
-        logger.error(f"Failed to save users.json: {e}")
+        logger.error(f"Failed to save {USERS_LOG_FILE}: {e}")
         if IS_LOGGING_ENABLED:
-            asyncio.create_task(log_bot.send_message(LOG_CHANNEL_ID, f"Failed to save users.json: {e}"))
+            asyncio.create_task(send_log_message(f"Failed to save {USERS_LOG_FILE}: {e}"))
 
 users = load_users()
 
+# File catalog
+def normalize_text(text: str) -> str:
+    return " ".join(text.lower().split())
+
+def tokenize(text: str) -> list:
+    return re.findall(r'[a-z0-9]+', text.lower())
+
+def trigrams(text: str) -> set:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+def token_grams(token: str) -> set:
+    # Padded so that short tokens and word boundaries still produce trigrams
+    return trigrams(f"  {token} ")
+
+EPISODE_PATTERNS = (
+    re.compile(r'\bs(?:eason)?\s*0*(\d{1,3})\s*e(?:p(?:isode)?)?\s*0*(\d{1,4})\b'),
+    re.compile(r'\bseason\s*0*(\d{1,3})\b.*?\b(?:e|ep|episode)\s*0*(\d{1,4})\b'),
+)
+EPISODE_ONLY_PATTERN = re.compile(r'\b(?:e|ep|episode)\s*0*(\d{1,4})\b')
+SEASON_ONLY_PATTERN = re.compile(r'\b(?:s|season)\s*0*(\d{1,3})\b')
+
+def is_episode_code(token: str) -> bool:
+    # s01e05, e05, ep5, s2 and the like; ranked search scores these through the episode boosts
+    return any(char.isdigit() for char in token) and extract_episode_numbers(token) != (None, None)
+
+def extract_episode_numbers(text: str) -> tuple:
+    text = text.lower()
+    for pattern in EPISODE_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            return int(match.group(1)), int(match.group(2))
+    episode = EPISODE_ONLY_PATTERN.search(text)
+    season = SEASON_ONLY_PATTERN.search(text)
+    return (int(season.group(1)) if season else None, int(episode.group(1)) if episode else None)
+
+BASE62_ALPHABET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+
+def base62_encode(number: int) -> str:
+    digits = []
+    while True:
+        number, remainder = divmod(number, 62)
+        digits.append(BASE62_ALPHABET[remainder])
+        if not number:
+            return "".join(reversed(digits))
+
+def file_key(chat_id: int, message_id: int) -> str:
+    # Raw file_ids can exceed the 64-char start parameter limit; a channel post is short and stable
+    return base62_encode((abs(chat_id) << 32) | message_id)
+
+# Searches and indexing run in their own threads so the event loop never waits on a catalog lock.
+# A search that outlives SHARD_SEARCH_TIMEOUT can only tie up the search pool.
+search_executor = ThreadPoolExecutor(max_workers=SEARCH_WORKERS, thread_name_prefix='search')
+index_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='index')
+
+class FileCatalog:
+    def __init__(self, path: str):
+        self.path = path
+        self.entries = []
+        self.names = []
+        self.by_message = {}
+        self.by_key = {}
+        self.token_index = defaultdict(set)
+        self.gram_index = defaultdict(set)
+        self.vocab_grams = defaultdict(set)
+        self.lengths = []
+        self.length_docs = defaultdict(set)
+        self.total_length = 0
+        self.episodes = []
+        self.season_docs = defaultdict(set)
+        self.episode_docs = defaultdict(set)
+        self._sort_order = None
+        # Held by searches on search_executor and by indexing on index_executor, never on the event loop
+        self._lock = threading.Lock()
+
+    def load(self):
+        try:
+            with open(self.path, 'r') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        self.add(json.loads(line))
+                    except (json.JSONDecodeError, KeyError) as e:
+                        logger.warning(f"Skipping invalid line in {self.path}: {e}")
+            logger.info(f"Loaded {len(self.by_message)} files from {self.path}")
+        except FileNotFoundError:
+            logger.warning(f"{self.path} not found, starting with empty file catalog")
+
+    def _index(self, doc_id: int, name: str):
+        tokens = set(tokenize(name))
+        for token in tokens:
+            if token not in self.token_index:
+                for gram in token_grams(token):
+                    self.vocab_grams[gram].add(token)
+            self.token_index[token].add(doc_id)
+        for gram in trigrams(name):
+            self.gram_index[gram].add(doc_id)
+        self.lengths[doc_id] = len(tokens)
+        self.length_docs[len(tokens)].add(doc_id)
+        self.total_length += len(tokens)
+        season, episode = self.episodes[doc_id] = extract_episode_numbers(name)
+        if season is not None:
+            self.season_docs[season].add(doc_id)
+        if episode is not None:
+            self.episode_docs[episode].add(doc_id)
+
+    def _unindex(self, doc_id: int, name: str):
+        for token in set(tokenize(name)):
+            self.token_index[token].discard(doc_id)
+        for gram in trigrams(name):
+            self.gram_index[gram].discard(doc_id)
+        self.length_docs[self.lengths[doc_id]].discard(doc_id)
+        season, episode = self.episodes[doc_id]
+        self.season_docs[season].discard(doc_id)
+        self.episode_docs[episode].discard(doc_id)
+        self.total_length -= self.lengths[doc_id]
+
+    def add(self, entry: dict) -> bool:
+        with self._lock:
+            return self._add(entry)
+
+    async def insert(self, entry: dict) -> bool:
+        return await asyncio.get_running_loop().run_in_executor(index_executor, self.add, entry)
+
+    def _add(self, entry: dict) -> bool:
+        key = (entry['chat_id'], entry['message_id'])
+        name = normalize_text(entry['file_name'])
+        # Catalogs written before short keys existed get them on load
+        entry.setdefault('key', file_key(*key))
+        doc_id = self.by_message.get(key)
+        if doc_id is not None:
+            old = self.entries[doc_id]
+            if old['file_id'] == entry['file_id'] and old['file_name'] == entry['file_name']:
+                return False
+            self._unindex(doc_id, self.names[doc_id])
+            self.entries[doc_id] = entry
+            self.names[doc_id] = name
+        else:
+            doc_id = len(self.entries)
+            self.entries.append(entry)
+            self.names.append(name)
+            self.lengths.append(0)
+            self.episodes.append((None, None))
+            self.by_message[key] = doc_id
+            self.by_key[entry['key']] = doc_id
+        self._index(doc_id, name)
+        self._sort_order = None
+        return True
+
+    def _candidates(self, query: str) -> set:
+        grams = trigrams(query)
+        if grams:
+            postings = sorted((self.gram_index.get(gram, set()) for gram in grams), key=len)
+            candidates = postings[0]
+            for posting in postings[1:]:
+                if not candidates:
+                    break
+                candidates = candidates & posting
+            return candidates
+        # Queries shorter than a trigram: scan the vocabulary instead of every file
+        candidates = set()
+        for token, posting in self.token_index.items():
+            if query in token:
+                candidates |= posting
+        return candidates
+
+    def _order(self) -> list:
+        if self._sort_order is None:
+            self._sort_order = sorted(range(len(self.entries)), key=self.names.__getitem__)
+        return self._sort_order
+
+    def search(self, query: str, limit: int) -> list:
+        query = normalize_text(query)
+        if not query:
+            return []
+        with self._lock:
+            return self._search(query, limit)
+
+    def _search(self, query: str, limit: int) -> list:
+        candidates = self._candidates(query)
+        names = self.names
+        if len(candidates) > limit * 8:
+            # Broad query: walk the name order and stop after `limit` hits instead of sorting every match
+            results = []
+            for doc_id in self._order():
+                if doc_id in candidates and query in names[doc_id]:
+                    results.append(self.entries[doc_id])
+                    if len(results) >= limit:
+                        break
+            return results
+        matches = sorted((doc_id for doc_id in candidates if query in names[doc_id]), key=names.__getitem__)
+        return [self.entries[doc_id] for doc_id in matches[:limit]]
+
+    def get(self, key: str):
+        doc_id = self.by_key.get(key)
+        return None if doc_id is None else self.entries[doc_id]
+
+    def ranked_search(self, query: str, limit: int, corpus: tuple = None) -> list:
+        # corpus is (doc_count, avg_length, document frequencies) over every shard; without it
+        # the scores only rank within this catalog
+        query = normalize_text(query)
+        if not query:
+            return []
+        with self._lock:
+            return self._ranked_search(query, limit, corpus)
+
+    def term_stats(self, query: str) -> tuple:
+        # This shard's share of the BM25 corpus statistics for the query's (expanded) terms
+        with self._lock:
+            frequencies = {vocab: len(self.token_index[vocab])
+                           for token in dict.fromkeys(tokenize(normalize_text(query)))
+                           if not is_episode_code(token)
+                           for vocab, _ in self._expand(token)}
+            return len(self.entries), self.total_length, frequencies
+
+    def _expand(self, token: str) -> list:
+        # Vocabulary tokens within trigram-similarity range of a (possibly misspelled) query token
+        if any(char.isdigit() for char in token):
+            # Episode codes, years and resolutions only match exactly
+            return [(token, 1.0)] if self.token_index.get(token) else []
+        grams = token_grams(token)
+        shared = defaultdict(int)
+        for gram in grams:
+            for candidate in self.vocab_grams.get(gram, ()):
+                shared[candidate] += 1
+        expansions = []
+        for candidate, count in shared.items():
+            # A padded token of length n has n + 1 trigrams
+            similarity = count / (len(grams) + len(candidate) + 1 - count)
+            if candidate.startswith(token):
+                similarity = 1.0 if candidate == token else max(similarity, 0.8)
+            if similarity >= FUZZY_MIN_SIMILARITY and self.token_index.get(candidate):
+                expansions.append((candidate, similarity))
+        return heapq.nlargest(FUZZY_MAX_EXPANSIONS, expansions, key=lambda item: item[1])
+
+    def _first_by_name(self, docs: set, limit: int) -> list:
+        # Walking the name order costs about limit * total / len(docs) steps, sorting about len(docs)
+        if len(docs) * len(docs) > limit * len(self.entries):
+            results = []
+            for doc_id in self._order():
+                if doc_id in docs:
+                    results.append(doc_id)
+                    if len(results) >= limit:
+                        break
+            return results
+        return heapq.nsmallest(limit, docs, key=self.names.__getitem__)
+
+    def _ranked_search(self, query: str, limit: int, corpus: tuple = None) -> list:
+        if not self.entries:
+            return []
+        if corpus is None:
+            corpus = (len(self.entries), self.total_length / len(self.entries), {})
+        doc_count, avg_length, frequencies = corpus
+        terms = []
+        for token in dict.fromkeys(tokenize(query)):
+            if is_episode_code(token):
+                # Counted once, through the boosts below, rather than as a rare high-idf term too
+                continue
+            expansions = self._expand(token)
+            if expansions:
+                # BM25 with binary term frequency: a matching expansion contributes similarity * idf
+                postings = []
+                for vocab, similarity in expansions:
+                    posting = self.token_index[vocab]
+                    frequency = frequencies.get(vocab, len(posting))
+                    postings.append((posting, similarity * math.log(1 + (doc_count - frequency + 0.5) / (frequency + 0.5))))
+                terms.append(postings)
+        query_season, query_episode = extract_episode_numbers(query)
+        boosts = []
+        if query_episode is not None:
+            boosts.append((self.episode_docs.get(query_episode, set()), EPISODE_MATCH_BOOST))
+        if query_season is not None:
+            boosts.append((self.season_docs.get(query_season, set()), EPISODE_MATCH_BOOST / 2))
+        candidates = set().union(*(posting for postings in terms for posting, _ in postings))
+        if query_episode is not None:
+            # "episode 5" should find S01E05 even though no name contains the token "5"
+            candidates |= self.episode_docs.get(query_episode, set())
+        elif query_season is not None and not terms:
+            candidates |= self.season_docs.get(query_season, set())
+        if not candidates:
+            return []
+
+        # Files sharing the same matched terms, name length and episode match score identically, so
+        # split the candidates into such groups with set operations instead of scoring file by file
+        groups = [(candidates, 0.0)]
+        for postings in terms:
+            split = []
+            for docs, score in groups:
+                # A query token counts once per file, via its best-scoring expansion
+                for posting, weight in postings:
+                    matched = docs & posting
+                    if matched:
+                        split.append((matched, score + weight))
+                        docs -= matched
+                        if not docs:
+                            break
+                if docs:
+                    split.append((docs, score))
+            groups = split
+
+        avg_length = avg_length or 1
+        norms = {length: (BM25_K1 + 1) / (1 + BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length))
+                 for length, bucket in self.length_docs.items() if bucket}
+        min_norm, max_norm = min(norms.values()), max(norms.values())
+        max_boost = sum(boost for _, boost in boosts)
+        if terms and max_boost:
+            # A matching episode only reorders files within the title matches: together the boosts
+            # stay below what the weakest title token adds to any file it matches
+            ceiling = EPISODE_BOOST_CEILING * min_norm * min(max(weight for _, weight in postings) for postings in terms)
+            if max_boost > ceiling:
+                boosts = [(docs, boost * ceiling / max_boost) for docs, boost in boosts]
+                max_boost = ceiling
+        # Drop groups that cannot reach the top `limit` files whatever their length or episode
+        groups.sort(key=lambda group: -group[1])
+        kept, count, floor = [], 0, None
+        for docs, score in groups:
+            if floor is not None and score * max_norm + max_boost < floor:
+                break
+            kept.append((docs, score))
+            count += len(docs)
+            if floor is None and count >= limit:
+                floor = score * min_norm
+        split = []
+        for docs, score in kept:
+            for length, norm in norms.items():
+                matched = docs & self.length_docs[length]
+                if matched:
+                    split.append((matched, score * norm))
+        groups = split
+        for boosted, boost in boosts:
+            split = []
+            for docs, score in groups:
+                matched = docs & boosted
+                if matched:
+                    split.append((matched, score + boost))
+                    docs -= matched
+                if docs:
+                    split.append((docs, score))
+            groups = split
+
+        groups.sort(key=lambda group: -group[1])
+        results = []
+        position = 0
+        while position < len(groups) and len(results) < limit:
+            docs, score = groups[position]
+            position += 1
+            while position < len(groups) and groups[position][1] == score:
+                docs = docs | groups[position][0]
+                position += 1
+            for doc_id in self._first_by_name(docs, limit - len(results)):
+                results.append(((-score, self.names[doc_id]), self.entries[doc_id]))
+        return results
+
+    async def persist(self, entries: list):
+        lines = [json.dumps(entry, separators=(',', ':')) for entry in entries]
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, append_lines, self.path, lines)
+        except OSError as e:
+            logger.error(f"Failed to save {self.path}: {e}")
+
+def extract_file_entry(message, chat_id: int, message_id: int):
+    if message.document:
+        kind, file_id = 'document', message.document.file_id
+        file_name = message.document.file_name or message.caption or "document_file"
+    elif message.video:
+        kind, file_id = 'video', message.video.file_id
+        file_name = message.caption or message.video.file_name or "video_file"
+    elif message.audio:
+        kind, file_id = 'audio', message.audio.file_id
+        file_name = message.audio.file_name or "audio_file"
+    elif message.photo:
+        kind, file_id = 'photo', message.photo[-1].file_id
+        file_name = message.caption or "photo_file"
+    else:
+        return None
+    return {'chat_id': chat_id, 'message_id': message_id, 'file_id': file_id, 'file_name': file_name, 'kind': kind,
+            'key': file_key(chat_id, message_id)}
+
+def load_file_catalogs() -> dict:
+    catalogs = {}
+    for channel_id in DB_CHANNELS:
+        path = FILES_FILE.format(channel=abs(channel_id))
+        if channel_id == DB_CHANNEL_1 and not os.path.exists(path) and os.path.exists(LEGACY_FILES_FILE):
+            logger.info(f"Moving {LEGACY_FILES_FILE} to {path}")
+            os.replace(LEGACY_FILES_FILE, path)
+        catalogs[channel_id] = FileCatalog(path)
+        catalogs[channel_id].load()
+    return catalogs
+
+# One catalog per DB channel shard
+file_catalogs = load_file_catalogs()
+
+def catalog_file_count() -> int:
+    return sum(len(catalog.by_message) for catalog in file_catalogs.values())
+
+def find_file(key: str):
+    for catalog in file_catalogs.values():
+        entry = catalog.get(key)
+        if entry is not None:
+            return entry
+    return None
+
 # Generate season data
 def generate_season_data():
     season_data = {}
@@ -122,59 +1004,233 @@ def generate_season_data():
     logger.info(f"Generated {num_seasons} seasons with {TOTAL_EPISODES} total episodes")
     return season_data
 
+# Settings repository
+class SettingsRepository:
+    # UI fields and the bulky season/episode payload live in separate files so small edits stay cheap
+    def __init__(self, settings_path: str, seasons_path: str):
+        self.settings_path = settings_path
+        self.seasons_path = seasons_path
+        self.settings = None
+        self.ui_writer = DebouncedWriter(settings_path, self._ui_snapshot, SETTINGS_SAVE_DELAY)
+        self.seasons_writer = DebouncedWriter(seasons_path, self._seasons_snapshot, SETTINGS_SAVE_DELAY)
+
+    def _ui_snapshot(self) -> dict:
+        return {key: self.settings.get(key) for key in UI_SETTINGS_KEYS}
+
+    def _seasons_snapshot(self) -> dict:
+        return {season_key: dict(season_info) for season_key, season_info in self.settings['season_data'].items()}
+
+    def _load_seasons(self):
+        try:
+            with open(self.seasons_path, 'r') as f:
+                season_data = json.load(f)
+                logger.info(f"Loaded season data from {self.seasons_path}")
+                return season_data
+        except FileNotFoundError:
+            logger.warning(f"{self.seasons_path} not found, generating season data")
+        except json.JSONDecodeError as e:
+            logger.error(f"Invalid JSON in {self.seasons_path}: {e}")
+        return None
+
+    def load(self) -> dict:
+        try:
+            with open(self.settings_path, 'r') as f:
+                settings = json.load(f)
+                logger.info(f"Loaded settings from {self.settings_path}")
+            changed = False
+        except FileNotFoundError:
+            logger.warning(f"{self.settings_path} not found, using default settings")
+            settings = dict(DEFAULT_SETTINGS)
+            changed = True
+        except json.JSONDecodeError as e:
+            logger.error(f"Invalid JSON in {self.settings_path}: {e}")
+            settings = dict(DEFAULT_SETTINGS)
+            changed = True
+
+        season_data = settings.get('season_data')
+        migrate = season_data is not None
+        if migrate:
+            logger.info(f"Moving season data from {self.settings_path} to {self.seasons_path}")
+        else:
+            season_data = self._load_seasons()
+        if season_data is None:
+            season_data = generate_season_data()
+            migrate = True
+        settings['season_data'] = season_data
+        self.settings = settings
+        if migrate:
+            # seasons.json must be durable before settings.json is rewritten without season_data,
+            # or a crash in between would lose every customized season
+            try:
+                write_atomic(self.seasons_path, json.dumps(self._seasons_snapshot(), separators=(',', ':'), ensure_ascii=False))
+            except OSError as e:
+                logger.error(f"Failed to save {self.seasons_path}, keeping {self.settings_path} as is: {e}")
+                return settings
+        # Only a migration or fresh defaults need writing back; a plain boot leaves settings.json alone
+        if migrate or changed:
+            self.save()
+        return settings
+
+    def save(self, seasons: bool = False):
+        self.ui_writer.schedule()
+        if seasons:
+            self.seasons_writer.schedule()
+
+    async def flush(self):
+        await self.ui_writer.flush()
+        await self.seasons_writer.flush()
+
+settings_repository = SettingsRepository(SETTINGS_FILE, SEASONS_FILE)
+
 # Load settings
 def load_settings():
-    try:
-        with open(SETTINGS_FILE, 'r') as f:
-            settings = json.load(f)
-            logger.info("Loaded settings from settings.json")
-            return settings
-    except FileNotFoundError:
-        logger.warning("settings.json not found, using default settings")
-        default_settings = {
-            'start_text': '🌟 Welcome! Choose a season or option:',
-            'start_pic': None,
-            'cover_pic': None,
-            'season_data': generate_season_data()
-        }
-        save_settings(default_settings)
-        return default_settings
-    except json.JSONDecodeError as e:
-        logger.error(f"Invalid JSON in settings.json: {e}")
-        default_settings = {
-            'start_text': '🌟 Welcome! Choose a season or option:',
-            'start_pic': None,
-            'cover_pic': None,
-            'season_data': generate_season_data()
-        }
-        save_settings(default_settings)
-        return default_settings
+    return settings_repository.load()
 
-def save_settings(settings):
-    try:
-        with open(SETTINGS_FILE, 'w') as f:
-            json.dump(settings, f, indent=4)
-        logger.info("Saved settings to settings.json")
-    except Exception as e:
-        logger.error(f"Failed to save settings.json: {e}")
-        if IS_LOGGING_ENABLED:
-            asyncio.create_task(log_bot.send_message(LOG_CHANNEL_ID, f"Failed to save settings.json: {e}"))
+def save_settings(settings, seasons: bool = False):
+    settings_repository.settings = settings
+    settings_repository.save(seasons)
 
 settings = load_settings()
 COVER_PHOTO_ID = settings['cover_pic']
 season_data = settings['season_data']
 
+# Episode index
+class EpisodeIndex:
+    def __init__(self):
+        self.episodes = {}
+        self.numbers = []
+
+    def rebuild(self, season_data: dict):
+        episodes = {}
+        for season_key, season_info in season_data.items():
+            season_num = int(season_key.split('_')[1])
+            # JSON round trips turn the integer episode keys into strings
+            season_info['episodes'] = {int(ep_num): url for ep_num, url in season_info['episodes'].items()}
+            for ep_num, url in season_info['episodes'].items():
+                episodes[ep_num] = (season_key, season_num, url)
+        self.episodes = episodes
+        self.numbers = sorted(episodes)
+        logger.info(f"Indexed {len(episodes)} episodes")
+
+    def get(self, episode_number: int):
+        return self.episodes.get(episode_number, (None, None, None))
+
+    def range(self, first: int, last: int) -> list:
+        start = bisect.bisect_left(self.numbers, first)
+        end = bisect.bisect_right(self.numbers, last)
+        return [(ep_num,) + self.episodes[ep_num] for ep_num in self.numbers[start:end]]
+
+episode_index = EpisodeIndex()
+episode_index.rebuild(season_data)
+
 # User state management
-user_states = defaultdict(lambda: {
-    'last_action': None,
-    'last_season': None,
-    'search_results': [],
-    'search_page': 1,
-    'search_query': None,
-    'edit_state': None,
-    'awaiting_broadcast': False,
-    'broadcast_content': None,
-})
+class UserSession:
+    __slots__ = (
+        'last_action',
+        'last_season',
+        'search_cursor',
+        'search_page',
+        'edit_state',
+        'awaiting_broadcast',
+        'broadcast_content',
+        'awaiting_cover',
+    )
+
+    def __init__(self):
+        self.last_action = None
+        self.last_season = None
+        self.search_cursor = None
+        self.search_page = 1
+        self.edit_state = None
+        self.awaiting_broadcast = False
+        self.broadcast_content = None
+        self.awaiting_cover = False
+
+class SessionStore:
+    # Per-user objects kept in access order and dropped once idle or over capacity
+    def __init__(self, factory, idle_timeout: float, maxsize: int):
+        self.factory = factory
+        self.idle_timeout = idle_timeout
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+
+    def __len__(self):
+        return len(self._items)
+
+    def __getitem__(self, user_id):
+        item = self._items.get(user_id)
+        if item is None:
+            item = [0, self.factory()]
+            self._items[user_id] = item
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+        else:
+            self._items.move_to_end(user_id)
+        item[0] = time.monotonic()
+        return item[1]
+
+    def peek(self, user_id):
+        item = self._items.get(user_id)
+        return item[1] if item else None
+
+    def pop(self, user_id):
+        self._items.pop(user_id, None)
+
+    def expire(self) -> int:
+        deadline = time.monotonic() - self.idle_timeout
+        expired = 0
+        while self._items:
+            user_id, item = next(iter(self._items.items()))
+            if item[0] > deadline:
+                break
+            del self._items[user_id]
+            expired += 1
+        return expired
+
+user_states = SessionStore(UserSession, SESSION_IDLE_TIMEOUT, SESSION_MAX_USERS)
+
+# Rate limiter
+class SlidingWindowLimiter:
+    # Timestamps of each user's recent requests; over-limit requests are rejected instead of queued
+    def __init__(self, limit: int, window: float):
+        self.limit = limit
+        self.window = window
+        self.hits = {}
+        self.notified = {}
+
+    def __len__(self):
+        return len(self.hits)
+
+    def allow(self, user_id) -> bool:
+        now = time.monotonic()
+        hits = self.hits.get(user_id)
+        if hits is None:
+            self.hits[user_id] = deque((now,), maxlen=self.limit)
+            return True
+        while hits and hits[0] <= now - self.window:
+            hits.popleft()
+        if len(hits) >= self.limit:
+            return False
+        hits.append(now)
+        return True
+
+    def should_notify(self, user_id) -> bool:
+        # One rate-limit notice per window, so rejected floods do not become reply floods
+        now = time.monotonic()
+        if now - self.notified.get(user_id, -self.window) < self.window:
+            return False
+        self.notified[user_id] = now
+        return True
+
+    def sweep(self) -> int:
+        deadline = time.monotonic() - self.window
+        idle = [user_id for user_id, hits in self.hits.items() if not hits or hits[-1] <= deadline]
+        for user_id in idle:
+            del self.hits[user_id]
+        self.notified = {user_id: ts for user_id, ts in self.notified.items() if ts > deadline}
+        return len(idle)
+
+rate_limiter = SlidingWindowLimiter(RATE_LIMIT, RATE_LIMIT_WINDOW)
 
 # Language support (English only)
 LANGUAGES = {
@@ -182,8 +1238,9 @@ LANGUAGES = {
     'invalid_season': 'Invalid season selection. 🚫 Try again!',
     'season_not_found': 'Season not found. 😔 Use /start to see available seasons.',
     'episode_not_found': 'Episode not found. 😔 Check the number and try again.',
-    'invalid_episode': 'Invalid episode number. Use /episode <number> (e.g., /episode 100). 🚫',
-    'help': 'Commands:\n/start - Start bot\n/episode <number> - Get episode link\n/clearhistory - Clear history\n/owner - Owner info\n/mainchannel - Join channel\n/guide - View guide\n/broadcast - Send message to all users (admin)\n/edit - Edit settings (admin)\n🔍 Type text to search (e.g., "naruto").',
+    'invalid_episode': 'Invalid episode number. Use /episode <number> (e.g., /episode 100) or /episode <from>-<to> (e.g., /episode 1-25). 🚫',
+    'episode_range_too_large': 'Too many episodes requested. 🚫 Ask for at most {limit} at a time.',
+    'help': 'Commands:\n/start - Start bot\n/episode <number> - Get episode link (or <from>-<to> for a range)\n/clearhistory - Clear history\n/owner - Owner info\n/mainchannel - Join channel\n/guide - View guide\n/broadcast - Send message to all users (admin)\n/edit - Edit settings (admin)\n/index - Index DB channel files (admin)\n🔍 Type text to search (e.g., "naruto").',
     'clearhistory': 'History cleared! 🗑️',
     'owner': 'Owner: @Dhileep_S 👨‍💼',
     'mainchannel': f'Join our channel: {UPDATES_CHANNEL} 📢',
@@ -191,6 +1248,7 @@ LANGUAGES = {
     'not_allowed': 'Command restricted to admins. 🚫 Contact @Dhileep_S.',
     'file_not_found': 'No files found for "{query}" 😔. Try another keyword.',
     'file_search_error': 'Error searching files. 😓 Try again later.',
+    'file_link_invalid': 'This file link is no longer available. 😔 Try searching again.',
     'multiple_files_found': 'Found {count} files for "{query}" 🎉:\n\n{file_list}\n\nNavigate pages or refine search.',
     'page_indicator': 'Page {current}/{total}',
     'db_not_configured': 'File search not enabled. 🚫 Contact @Dhileep_S.',
@@ -198,6 +1256,7 @@ LANGUAGES = {
     'cover_prompt': 'Send the cover photo.',
     'cover_invalid': 'Please send a valid photo. 🚫',
     'not_subscribed': f'You must join {UPDATES_CHANNEL} to use this bot. 📢\nJoin: https://t.me/bot_paiyan_official',
+    'inline_not_subscribed': f'Join {UPDATES_CHANNEL} to search files',
     'edit_menu': 'Edit settings:',
     'edit_start_text_prompt': 'Current start text: "{current}"\nSend new start text.',
     'edit_start_text_set': 'Start text updated! ✅',
@@ -213,7 +1272,7 @@ LANGUAGES = {
     'edit_link_saved': 'Season link settings saved! ✅',
     'loading': 'Processing your request… ⏳',
     'searching': 'Trying to find your query... 🔍',
-    'rate_limit': 'Too many requests! Please wait 60 seconds and try again. ⏲️',
+    'rate_limit': f'Too many requests! Please wait {RATE_LIMIT_WINDOW} seconds and try again. ⏲️',
     'retry_error': 'Error occurred. Retrying… 🔄',
     'cancel': 'Operation cancelled. ✅ Back to edit menu.',
     'refine_search': 'Refine search with a new keyword.',
@@ -221,17 +1280,318 @@ LANGUAGES = {
     'broadcast_confirm': 'Confirm broadcast to {user_count} users:\n\n{content}\n\nProceed?',
     'broadcast_success': 'Broadcast sent to {success_count} users. Failed: {fail_count}.',
     'broadcast_invalid': 'Please send a valid text message, photo, or video.',
-    'broadcast_cancelled': 'Broadcast cancelled.'
+    'broadcast_cancelled': 'Broadcast cancelled.',
+    'broadcast_progress': 'Broadcasting… {done}/{total} processed\nSent: {success_count} | Failed: {fail_count} | Removed (blocked): {pruned_count}',
+    'broadcast_running': 'A broadcast is already running. ⏳ Wait for it to finish.',
+    'index_prompt': 'Usage: /index <last_message_id> [first_message_id] [db_channel_id]',
+    'profile_started': 'Profiler started, writing samples to {path} 🔬',
+    'profile_stopped': 'Profiler stopped, profile saved to {path} ✅',
+    'profile_status': 'Profiler is {state}. Usage: /profile on|off',
+    'index_unknown_channel': 'Unknown DB channel. Configured channels: {channels}',
+    'index_started': 'Indexing DB channel messages {first}-{last}… ⏳',
+    'index_done': 'File catalog updated! {count} files indexed. ✅'
 }
 
+# Outbound dispatcher
+class TokenBucket:
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def delay(self, now: float) -> float:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+class OutboundDispatcher:
+    # Every Telegram send goes through one priority queue sharing the bot-wide and per-chat limits
+    def __init__(self, rate: float, chat_rate: float, chat_burst: float, concurrency: int):
+        self.global_bucket = TokenBucket(rate, rate)
+        self.chat_buckets = SessionStore(lambda: TokenBucket(chat_rate, chat_burst), 60, SESSION_MAX_USERS)
+        self.queue = []
+        self.delayed = []
+        self.paused_until = 0
+        self._seq = 0
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def __len__(self):
+        return len(self.queue) + len(self.delayed)
+
+    def _push(self, item: list):
+        heapq.heappush(self.queue, item)
+        self._wakeup.set()
+
+    async def submit(self, priority: int, chat_id, func, kwargs: dict):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        self._seq += 1
+        # [priority, seq, chat_id, func, kwargs, future, attempts]
+        self._push([priority, self._seq, chat_id, func, kwargs, future, 0])
+        return await future
+
+    async def _run(self):
+        while True:
+            now = time.monotonic()
+            while self.delayed and self.delayed[0][0] <= now:
+                self._push(heapq.heappop(self.delayed)[2])
+            if self.paused_until > now:
+                await asyncio.sleep(self.paused_until - now)
+                continue
+            if not self.queue:
+                self._wakeup.clear()
+                wait = self.delayed[0][0] - now if self.delayed else None
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            item = heapq.heappop(self.queue)
+            if item[5].cancelled():
+                continue
+            chat_id = item[2]
+            if chat_id is not None:
+                wait = self.chat_buckets[chat_id].delay(now)
+                if wait > 0:
+                    heapq.heappush(self.delayed, (now + wait, item[1], item))
+                    continue
+            wait = self.global_bucket.delay(now)
+            if wait > 0:
+                heapq.heappush(self.queue, item)
+                await asyncio.sleep(wait)
+                continue
+            self.global_bucket.take()
+            if chat_id is not None:
+                self.chat_buckets[chat_id].take()
+            await self._semaphore.acquire()
+            asyncio.create_task(self._execute(item))
+
+    async def _execute(self, item: list):
+        future = item[5]
+        try:
+            result = await item[3](**item[4])
+            if not future.done():
+                future.set_result(result)
+        except RetryAfter as e:
+            # A flood wait covers the whole bot, so the entire queue pauses
+            self.paused_until = max(self.paused_until, time.monotonic() + e.retry_after)
+            item[6] += 1
+            logger.warning(f"Flood wait {e.retry_after}s, pausing outbound queue (attempt {item[6]}/{OUTBOUND_MAX_RETRIES})")
+            if item[6] < OUTBOUND_MAX_RETRIES:
+                self._push(item)
+            elif not future.done():
+                future.set_exception(e)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+        finally:
+            self._semaphore.release()
+
+outbox = OutboundDispatcher(GLOBAL_SEND_RATE, PER_CHAT_SEND_RATE, PER_CHAT_SEND_BURST, OUTBOUND_CONCURRENCY)
+
+async def dispatch(func, priority: int = PRIORITY_INTERACTIVE, per_chat: bool = True, **kwargs):
+    # The span includes time spent queued behind the rate limits, not just the API call
+    with Span(f"telegram.{getattr(func, '__name__', 'call')}"):
+        return await outbox.submit(priority, kwargs.get('chat_id') if per_chat else None, func, kwargs)
+
+async def send_log_message(text: str):
+    await dispatch(log_bot.send_message, priority=PRIORITY_DELETE, chat_id=LOG_CHANNEL_ID, text=text)
+
+# Auto-delete scheduler
+class DeletionScheduler:
+    # One task drains a min-heap of (due_time, chat_id, message_id). The heap is persisted as an
+    # append-only log of "+due chat_id message_id" and "-chat_id message_id" (done) records,
+    # rewritten from the heap once most of its lines are stale
+    def __init__(self, log_path: str, legacy_path: str):
+        self.log_path = log_path
+        self.legacy_path = legacy_path
+        self.heap = []
+        self.pending_lines = []
+        self.log_line_count = 0
+        self.bot = None
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._flush_task = None
+        self._flush_lock = asyncio.Lock()
+
+    def __len__(self):
+        return len(self.heap)
+
+    def load(self):
+        due_times = {}
+        try:
+            with open(self.log_path, 'r') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    self.log_line_count += 1
+                    try:
+                        fields = line[1:].split()
+                        if line[0] == '+':
+                            due_times[(int(fields[1]), int(fields[2]))] = float(fields[0])
+                        elif line[0] == '-':
+                            due_times.pop((int(fields[0]), int(fields[1])), None)
+                        else:
+                            raise ValueError
+                    except (ValueError, IndexError):
+                        logger.warning(f"Skipping invalid line in {self.log_path}: {line!r}")
+        except FileNotFoundError:
+            due_times = self._load_legacy()
+            self.log_line_count = -1  # forces the compaction below to write the log
+        self.heap = [(due, chat_id, message_id) for (chat_id, message_id), due in due_times.items()]
+        heapq.heapify(self.heap)
+        logger.info(f"Loaded {len(self.heap)} pending deletions from {self.log_path}")
+        if self.log_line_count < 0 or self.log_line_count > 2 * len(self.heap) + 1000:
+            self._compact(self.heap)
+            self.log_line_count = len(self.heap)
+
+    def _load_legacy(self) -> dict:
+        try:
+            with open(self.legacy_path, 'r') as f:
+                due_times = {(chat_id, message_id): due for due, chat_id, message_id in json.load(f)}
+                logger.info(f"Migrating {len(due_times)} pending deletions from {self.legacy_path} to {self.log_path}")
+                return due_times
+        except FileNotFoundError:
+            logger.warning(f"{self.log_path} not found, starting with no pending deletions")
+        except (json.JSONDecodeError, TypeError, ValueError) as e:
+            logger.error(f"Invalid JSON in {self.legacy_path}: {e}")
+        return {}
+
+    def _compact(self, heap: list):
+        write_atomic(self.log_path, "".join(f"+{due} {chat_id} {message_id}\n" for due, chat_id, message_id in heap))
+
+    def _record(self, line: str):
+        self.pending_lines.append(line)
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.get_running_loop().create_task(self._delayed_flush())
+
+    async def _delayed_flush(self):
+        await asyncio.sleep(PERSIST_DELAY)
+        await self.flush()
+
+    async def flush(self):
+        async with self._flush_lock:
+            lines, self.pending_lines = self.pending_lines, []
+            compact = self.log_line_count + len(lines) > 2 * len(self.heap) + 1000
+            try:
+                if compact:
+                    # The heap already reflects every pending line, so the rewrite replaces them
+                    heap = list(self.heap)
+                    await asyncio.get_running_loop().run_in_executor(None, self._compact, heap)
+                    self.log_line_count = len(heap)
+                elif lines:
+                    await asyncio.get_running_loop().run_in_executor(None, append_lines, self.log_path, lines)
+                    self.log_line_count += len(lines)
+            except OSError as e:
+                self.pending_lines[:0] = lines
+                logger.error(f"Failed to save {self.log_path}: {e}")
+
+    def schedule(self, chat_id: int, message_id: int, delay: float = AUTO_DELETE_DURATION):
+        due = time.time() + delay
+        if not self.heap or due < self.heap[0][0]:
+            self._wakeup.set()
+        heapq.heappush(self.heap, (due, chat_id, message_id))
+        self._record(f"+{due} {chat_id} {message_id}")
+
+    def start(self, bot: Bot):
+        self.bot = bot
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            now = time.time()
+            due = []
+            while self.heap and self.heap[0][0] <= now:
+                due.append(heapq.heappop(self.heap))
+            if due:
+                await self._delete(due)
+                continue
+            self._wakeup.clear()
+            wait = self.heap[0][0] - now if self.heap else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _delete(self, due: list):
+        by_chat = defaultdict(list)
+        for _, chat_id, message_id in due:
+            by_chat[chat_id].append(message_id)
+        for chat_id, message_ids in by_chat.items():
+            for i in range(0, len(message_ids), DELETE_BATCH_SIZE):
+                chunk = message_ids[i:i + DELETE_BATCH_SIZE]
+                try:
+                    if hasattr(self.bot, 'delete_messages'):
+                        results = [await self._delete_chunk(chat_id, chunk)] * len(chunk)
+                    else:
+                        results = await asyncio.gather(*(dispatch(self.bot.delete_message, priority=PRIORITY_DELETE, per_chat=False, chat_id=chat_id, message_id=message_id) for message_id in chunk), return_exceptions=True)
+                except Exception as e:
+                    # A timeout or network error must not kill the scheduler task; try the batch again later
+                    logger.error(f"Failed to delete {len(chunk)} messages in chat {chat_id}, retrying in {DELETE_RETRY_DELAY}s: {e!r}")
+                    results = [e] * len(chunk)
+                for message_id, result in zip(chunk, results):
+                    if isinstance(result, RetryAfter):
+                        self.schedule(chat_id, message_id, result.retry_after)
+                    elif isinstance(result, Exception) and not isinstance(result, TelegramError):
+                        self.schedule(chat_id, message_id, DELETE_RETRY_DELAY)
+                    else:
+                        if isinstance(result, TelegramError):
+                            logger.error(f"Failed to delete message {message_id}: {result}")
+                        self._record(f"-{chat_id} {message_id}")
+                deleted = sum(1 for result in results if not isinstance(result, Exception))
+                if deleted:
+                    logger.info(f"Deleted {deleted} messages in chat {chat_id}")
+
+    async def _delete_chunk(self, chat_id: int, message_ids: list):
+        try:
+            return await dispatch(self.bot.delete_messages, priority=PRIORITY_DELETE, per_chat=False, chat_id=chat_id, message_ids=message_ids)
+        except TelegramError as e:
+            return e
+
+deletion_scheduler = DeletionScheduler(DELETIONS_LOG_FILE, DELETIONS_FILE)
+deletion_scheduler.load()
+
+# Render cache
+render_cache = {}
+
+def cached_markup(key, build):
+    # Markups are immutable, so one prebuilt instance is shared until settings change
+    markup = render_cache.get(key)
+    if markup is None:
+        markup = render_cache[key] = build()
+    return markup
+
+def invalidate_render_cache():
+    render_cache.clear()
+    logger.info("Cleared render cache")
+
 # Helper functions
 def create_link_keyboard():
-    return InlineKeyboardMarkup([
+    return cached_markup('link', lambda: InlineKeyboardMarkup([
         [InlineKeyboardButton("How to Resolve", url="https://t.me/+_SQNyZD8hns3NzY1")],
         [InlineKeyboardButton("Try Again", url="https://t.me/bot_paiyan_official")]
-    ])
+    ]))
 
-def create_pagination_keyboard(current_page: int, total_pages: int):
+def create_main_menu_keyboard():
+    return cached_markup('main_menu', lambda: ReplyKeyboardMarkup(
+        [[f"Season {i} 🎬"] for i in range(1, len(season_data) + 1)] + [['Help ❓'], ['Settings ⚙️']],
+        resize_keyboard=True,
+        one_time_keyboard=True
+    ))
+
+def build_pagination_keyboard(current_page: int, total_pages: int):
     keyboard = []
     if total_pages > 1:
         buttons = []
@@ -245,413 +1605,1122 @@ def create_pagination_keyboard(current_page: int, total_pages: int):
     keyboard.append([InlineKeyboardButton("🔍 Refine Search", callback_data="refine_search")])
     return InlineKeyboardMarkup(keyboard)
 
+def create_pagination_keyboard(current_page: int, total_pages: int):
+    return cached_markup(('pagination', current_page, total_pages), lambda: build_pagination_keyboard(current_page, total_pages))
+
 def create_edit_menu_keyboard():
-    return InlineKeyboardMarkup([
+    return cached_markup('edit_menu', lambda: InlineKeyboardMarkup([
         [InlineKeyboardButton("✍️ Start Text", callback_data="edit_start_text")],
         [InlineKeyboardButton("📷 Start Pic", callback_data="edit_start_pic")],
         [InlineKeyboardButton("🖼️ Cover Pic", callback_data="edit_cover")],
         [InlineKeyboardButton("🔗 Link Edit", callback_data="edit_link")],
         [InlineKeyboardButton("❌ Cancel", callback_data="cancel")]
-    ])
+    ]))
 
-def create_season_selection_keyboard(prefix: str):
+def build_season_selection_keyboard(prefix: str):
     keyboard = [[InlineKeyboardButton(f"Season {i} 🎬", callback_data=f"{prefix}_season_{i}")] for i in range(1, len(season_data) + 1)]
     keyboard.append([InlineKeyboardButton("⬅️ Back", callback_data="cancel")])
     return InlineKeyboardMarkup(keyboard)
 
+def create_season_selection_keyboard(prefix: str):
+    return cached_markup(('season_selection', prefix), lambda: build_season_selection_keyboard(prefix))
+
+def season_display_name(season_key: str) -> str:
+    return f"Season {season_key.split('_')[1]}"
+
+def create_season_info_keyboard(season_key: str):
+    season_info = season_data[season_key]
+    return cached_markup(('season_info', season_key), lambda: InlineKeyboardMarkup([
+        [InlineKeyboardButton(f"🎬 {season_display_name(season_key)}", callback_data=f"info_{season_key}")],
+        [InlineKeyboardButton("🔗 Link-Shortner", callback_data=f"resolve_{season_key}")],
+        [InlineKeyboardButton("⬅️ Back to Menu", callback_data="back_to_menu")]
+    ] + list(season_info['buttons'])))
+
+def create_season_link_keyboard(season_key: str):
+    season_info = season_data[season_key]
+    return cached_markup(('season_link', season_key), lambda: InlineKeyboardMarkup(
+        list(season_info['buttons']) + list(create_link_keyboard().inline_keyboard)
+    ))
+
 def create_confirm_keyboard(action: str, data: str):
-    return InlineKeyboardMarkup([
+    return cached_markup(('confirm', action, data), lambda: InlineKeyboardMarkup([
         [InlineKeyboardButton("✅ Yes", callback_data=f"confirm_{action}_{data}")],
         [InlineKeyboardButton("❌ No", callback_data="cancel")]
-    ])
+    ]))
 
 def create_broadcast_confirm_keyboard(content: str):
-    return InlineKeyboardMarkup([
+    return cached_markup('broadcast_confirm', lambda: InlineKeyboardMarkup([
         [InlineKeyboardButton("✅ Send", callback_data="confirm_broadcast")],
         [InlineKeyboardButton("❌ Cancel", callback_data="cancel_broadcast")]
-    ])
+    ]))
+
+async def send_main_menu(context: ContextTypes.DEFAULT_TYPE, chat_id: int):
+    reply_markup = create_main_menu_keyboard()
+    if settings['start_pic']:
+        await retry_with_backoff(lambda: dispatch(context.bot.send_photo,
+            chat_id=chat_id,
+            photo=settings['start_pic'],
+            caption=LANGUAGES['welcome'],
+            reply_markup=reply_markup
+        ))
+    else:
+        await send_message_with_auto_delete(context, chat_id, LANGUAGES['welcome'], reply_markup=reply_markup)
 
 async def send_message_with_auto_delete(context: ContextTypes.DEFAULT_TYPE, chat_id: int, text: str, reply_markup=None):
     try:
-        message = await context.bot.send_message(chat_id=chat_id, text=text, reply_markup=reply_markup)
-        asyncio.create_task(schedule_message_deletion(context, chat_id, message.message_id))
+        message = await dispatch(context.bot.send_message, chat_id=chat_id, text=text, reply_markup=reply_markup)
+        deletion_scheduler.schedule(chat_id, message.message_id)
         return message
     except TelegramError as e:
         logger.error(f"Error sending message: {e}")
-        message = await context.bot.send_message(chat_id=chat_id, text="Error occurred. Try again.")
-        asyncio.create_task(schedule_message_deletion(context, chat_id, message.message_id))
+        message = await dispatch(context.bot.send_message, chat_id=chat_id, text="Error occurred. Try again.")
+        deletion_scheduler.schedule(chat_id, message.message_id)
         return message
 
-async def schedule_message_deletion(context: ContextTypes.DEFAULT_TYPE, chat_id: int, message_id: int):
+# Shared HTTP session
+http_session = None
+
+def get_http_session() -> ClientSession:
+    global http_session
+    if http_session is None or http_session.closed:
+        connector = TCPConnector(limit=HTTP_POOL_SIZE, ttl_dns_cache=300, keepalive_timeout=60)
+        http_session = ClientSession(connector=connector, timeout=ClientTimeout(total=HTTP_TIMEOUT))
+    return http_session
+
+async def close_http_session():
+    if http_session is not None and not http_session.closed:
+        await http_session.close()
+
+# Short URL cache
+short_url_cache = TTLCache(SHORT_URL_CACHE_SIZE, SHORT_URL_CACHE_TTL)
+short_url_cache_writer = DebouncedWriter(SHORT_URL_CACHE_FILE, short_url_cache.dump)
+
+def load_short_url_cache():
     try:
-        await asyncio.sleep(AUTO_DELETE_DURATION)
-        await context.bot.delete_message(chat_id=chat_id, message_id=message_id)
-        logger.info(f"Deleted message {message_id}")
-    except TelegramError as e:
-        logger.error(f"Failed to delete message {message_id}: {e}")
+        with open(SHORT_URL_CACHE_FILE, 'r') as f:
+            short_url_cache.restore(json.load(f))
+        logger.info(f"Loaded {len(short_url_cache)} short URLs from {SHORT_URL_CACHE_FILE}")
+    except FileNotFoundError:
+        logger.warning(f"{SHORT_URL_CACHE_FILE} not found, starting with empty short URL cache")
+    except (json.JSONDecodeError, TypeError, ValueError) as e:
+        logger.error(f"Invalid JSON in {SHORT_URL_CACHE_FILE}: {e}")
+
+load_short_url_cache()
+
+def is_http_url(text: str) -> bool:
+    parsed = urlparse(text)
+    return parsed.scheme in ('http', 'https') and bool(parsed.netloc) and not any(char.isspace() for char in text)
 
 async def shorten_url(long_url: str, identifier: str) -> str:
+    cached = short_url_cache.get(long_url)
+    if cached:
+        short_url_lookups.inc('hit')
+        return cached
+    short_url_lookups.inc('miss')
+
     alias = f"{identifier}_{int(time.time())}"
-    api_url = "https://api.gplinks.com/api"
     params = {"api": GPLINK_API, "url": long_url, "alias": alias, "format": "text"}
     query_string = urlencode(params)
-    full_url = f"{api_url}?{query_string}"
+    full_url = f"{GPLINKS_API_URL}?{query_string}"
     
     try:
-        async with ClientSession() as session:
-            async with session.get(full_url) as response:
+        with gplinks_seconds.time(), Span('gplinks'):
+            async with get_http_session().get(full_url) as response:
                 if response.status == 200:
-                    short_url = await response.text()
+                    short_url = (await response.text()).strip()
+                    if not is_http_url(short_url):
+                        # gplinks reports some failures (bad API key, alias taken) as text with HTTP 200
+                        gplinks_requests.inc('invalid')
+                        logger.error(f"Failed to shorten URL: unexpected response {short_url[:200]!r}")
+                        return long_url
+                    gplinks_requests.inc('ok')
                     logger.info(f"Shortened URL: {short_url}")
-                    return short_url.strip()
+                    short_url_cache.set(long_url, short_url)
+                    short_url_cache_writer.schedule()
+                    return short_url
+                gplinks_requests.inc('http_error')
                 logger.error(f"Failed to shorten URL: HTTP {response.status}")
                 return long_url
     except Exception as e:
+        gplinks_requests.inc('error')
         logger.error(f"Error shortening URL: {e}")
         return long_url
 
-def find_episode(episode_number: int):
-    for season_key, season_info in season_data.items():
-        episodes = season_info["episodes"]
-        if episode_number in episodes:
-            season_num = int(season_key.split('_')[1])
-            return season_key, season_num, episodes[episode_number]
-    return None, None, None
+async def shorten_urls(links: list) -> list:
+    semaphore = asyncio.Semaphore(SHORTEN_CONCURRENCY)
+
+    async def shorten_one(long_url: str, identifier: str) -> str:
+        async with semaphore:
+            return await shorten_url(long_url, identifier)
+
+    return await asyncio.gather(*(shorten_one(long_url, identifier) for long_url, identifier in links))
 
-async def check_subscription(context: ContextTypes.DEFAULT_TYPE, user_id: int, chat_id: int) -> bool:
+def find_episode(episode_number: int):
+    return episode_index.get(episode_number)
+
+def find_episode_range(first: int, last: int) -> list:
+    return episode_index.range(first, last)
+
+# Subscription cache
+subscription_cache = TTLCache(SUBSCRIPTION_CACHE_SIZE, SUBSCRIPTION_CACHE_TTL)
+subscription_requests = {}
+
+async def coalesce(inflight: dict, key, factory):
+    # Concurrent callers with the same key share a single in-flight call
+    future = inflight.get(key)
+    if future is None:
+        future = asyncio.ensure_future(factory())
+        inflight[key] = future
+        future.add_done_callback(lambda _: inflight.pop(key, None))
+    return await asyncio.shield(future)
+
+def cache_subscription(user_id: int, is_member: bool):
+    subscription_cache.set(user_id, is_member, SUBSCRIPTION_CACHE_TTL if is_member else SUBSCRIPTION_NEGATIVE_TTL)
+
+async def fetch_subscription(bot: Bot, user_id: int) -> bool:
+    member = await bot.get_chat_member(chat_id=UPDATES_CHANNEL, user_id=user_id)
+    is_member = member.status in MEMBER_STATUSES
+    cache_subscription(user_id, is_member)
+    return is_member
+
+async def check_rate_limit(context: ContextTypes.DEFAULT_TYPE, user_id, chat_id: int) -> bool:
+    user_id = int(user_id)
+    if rate_limiter.allow(user_id):
+        return True
+    rate_limited.inc()
+    logger.info(f"User {user_id} hit the rate limit")
+    if rate_limiter.should_notify(user_id):
+        await send_message_with_auto_delete(context, chat_id, LANGUAGES['rate_limit'])
+    return False
+
+async def check_subscription(context: ContextTypes.DEFAULT_TYPE, user_id: int, chat_id: int = None) -> bool:
+    is_member = subscription_cache.get(user_id)
+    if is_member is not None:
+        subscription_lookups.inc('hit')
+        return is_member
+    subscription_lookups.inc('miss')
     try:
-        member = await context.bot.get_chat_member(chat_id=UPDATES_CHANNEL, user_id=user_id)
-        return member.status in ['member', 'administrator', 'creator']
+        with Span('subscription'):
+            return await coalesce(subscription_requests, user_id, lambda: fetch_subscription(context.bot, user_id))
     except TelegramError as e:
+        subscription_lookups.inc('error')
         logger.error(f"Error checking subscription: {e}")
-        await send_message_with_auto_delete(context, chat_id, LANGUAGES['not_subscribed'])
+        if chat_id is not None:
+            await send_message_with_auto_delete(context, chat_id, LANGUAGES['not_subscribed'])
         return False
 
-async def search_file_in_channel(context: ContextTypes.DEFAULT_TYPE, query: str, user_id: int) -> list:
-    cache_key = f"{user_id}:{query.lower()}"
-    cached = search_cache.get(cache_key)
-    if cached and (time.time() - cached['timestamp']) < SEARCH_CACHE_DURATION:
-        return cached['results']
+async def track_subscription(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat_member = update.chat_member
+    if (chat_member.chat.username or '').lower() != UPDATES_CHANNEL.lstrip('@').lower():
+        return
+    user_id = chat_member.new_chat_member.user.id
+    cache_subscription(user_id, chat_member.new_chat_member.status in MEMBER_STATUSES)
+    logger.info(f"User {user_id} is now {chat_member.new_chat_member.status} in {UPDATES_CHANNEL}")
 
-    matching_files = []
-    if IS_DB_ENABLED and DB_CHANNEL_1 < 0:
-        try:
-            async with timeout(SEARCH_TIMEOUT):
-                async for message in context.bot.get_chat_history(chat_id=DB_CHANNEL_1, limit=200):
-                    if len(matching_files) >= SEARCH_RESULT_LIMIT:
-                        break
-                    if message.document or message.video or message.audio or message.photo:
-                        file_name = (message.document.file_name if message.document else
-                                     message.caption or "video_file" if message.video else
-                                     message.audio.file_name or "audio_file" if message.audio else
-                                     message.caption or "photo_file")
-                        if file_name and query.lower() in file_name.lower():
-                            file_id = (message.document.file_id if message.document else
-                                       message.video.file_id if message.video else
-                                       message.audio.file_id if message.audio else
-                                       message.photo[-1].file_id)
-                            matching_files.append({'file_id': file_id, 'file_name': file_name})
-        except (TelegramError, asyncio.TimeoutError) as e:
-            logger.error(f"Error searching channel {DB_CHANNEL_1}: {e}")
+# Search cache
+search_cache = TTLCache(SEARCH_CACHE_SIZE, SEARCH_CACHE_DURATION)
+search_requests = {}
+
+def name_ordered_search(catalog: FileCatalog, query: str, limit: int) -> list:
+    return [(normalize_text(entry['file_name']), entry) for entry in catalog.search(query, limit)]
+
+async def in_search_pool(channel_id: int, func, *args):
+    pending = asyncio.get_running_loop().run_in_executor(search_executor, func, *args)
+    if len(file_catalogs) == 1:
+        return await pending
+    try:
+        return await asyncio.wait_for(pending, SHARD_SEARCH_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning(f"Search of channel {channel_id} timed out after {SHARD_SEARCH_TIMEOUT}s, returning partial results")
+        return None
+
+async def corpus_stats(query: str) -> tuple:
+    # BM25 needs one document count, average length and document frequency per term across all
+    # shards, otherwise each channel scores on its own scale and the merged order means nothing
+    parts = await asyncio.gather(*(in_search_pool(channel_id, catalog.term_stats, query)
+                                   for channel_id, catalog in file_catalogs.items()))
+    doc_count = total_length = 0
+    frequencies = defaultdict(int)
+    for part in parts:
+        if part is not None:
+            doc_count += part[0]
+            total_length += part[1]
+            for vocab, frequency in part[2].items():
+                frequencies[vocab] += frequency
+    return doc_count, total_length / doc_count if doc_count else 0, frequencies
+
+async def search_shard(channel_id: int, query: str, corpus: tuple = None) -> list:
+    # Returns (sort_key, entry) pairs so shards can be merged in either search mode
+    catalog = file_catalogs[channel_id]
+    if SEARCH_MODE == 'ranked':
+        results = await in_search_pool(channel_id, catalog.ranked_search, query, SEARCH_RESULT_LIMIT, corpus)
+    else:
+        results = await in_search_pool(channel_id, name_ordered_search, catalog, query, SEARCH_RESULT_LIMIT)
+    return results or []
+
+async def run_search(query: str) -> tuple:
+    matching_files = ()
+    if IS_DB_ENABLED:
+        with search_seconds.time():
+            corpus = await corpus_stats(query) if SEARCH_MODE == 'ranked' and len(file_catalogs) > 1 else None
+            shard_results = await asyncio.gather(*(search_shard(channel_id, query, corpus) for channel_id in file_catalogs))
+        # Each shard is already sorted on a shared scale, so a k-way merge keeps the global order
+        merged = heapq.merge(*shard_results, key=lambda item: item[0])
+        matching_files = tuple({'file_id': entry['file_id'], 'file_name': entry['file_name'], 'kind': entry.get('kind', 'document'), 'key': entry['key']}
+                               for _, entry in itertools.islice(merged, SEARCH_RESULT_LIMIT))
+    # Sessions keep a reference to this shared tuple instead of a per-user copy
+    search_cache.set(query, matching_files)
+    return matching_files
+
+async def search_file_in_channel(context: ContextTypes.DEFAULT_TYPE, query: str, user_id: int) -> tuple:
+    cache_key = normalize_text(query)
+    cached = search_cache.get(cache_key)
+    if cached is not None:
+        search_lookups.inc('hit')
+        return cached
+    search_lookups.inc('miss')
 
-    matching_files.sort(key=lambda x: x['file_name'].lower())
-    search_cache[cache_key] = {'results': matching_files, 'timestamp': time.time()}
+    with Span('search'):
+        matching_files = await coalesce(search_requests, cache_key, lambda: run_search(cache_key))
     logger.info(f"User {user_id} searched for '{query}', found {len(matching_files)} results")
     return matching_files
 
-async def retry_with_backoff(coro, max_retries=3, initial_delay=1):
+class SearchCursor:
+    # A user's position over a shared cached result tuple; pages are sliced and rendered on demand
+    __slots__ = ('query', 'key', 'results', 'generation')
+
+    def __init__(self, query: str, results: tuple):
+        self.query = query
+        self.key = normalize_text(query)
+        self.results = results
+        self.generation = search_generation
+
+    @property
+    def total(self) -> int:
+        return len(self.results)
+
+    @property
+    def total_pages(self) -> int:
+        return math.ceil(len(self.results) / FILES_PER_PAGE)
+
+    def page(self, page: int) -> tuple:
+        start = (page - 1) * FILES_PER_PAGE
+        return self.results[start:start + FILES_PER_PAGE]
+
+search_page_cache = TTLCache(SEARCH_PAGE_CACHE_SIZE, SEARCH_CACHE_DURATION)
+search_page_requests = {}
+search_page_prefetches = set()
+search_generation = 0
+
+def invalidate_search_cache():
+    global search_generation
+    # Cursors created before a re-index keep their own results, so their pages are keyed apart
+    search_generation += 1
+    search_cache.clear()
+    search_page_cache.clear()
+
+async def shorten_search_page(cursor: SearchCursor, page: int) -> tuple:
+    page_files = cursor.page(page)
+    long_urls = [f"https://t.me/Naruto_multilangbot?start=file_{file_info['key']}" for file_info in page_files]
+    short_urls = await shorten_urls([
+        (long_url, f"file_{file_info['key']}") for long_url, file_info in zip(long_urls, page_files)
+    ])
+    file_list = "\n".join(f"- {file_info['file_name']}: {short_url}" for file_info, short_url in zip(page_files, short_urls))
+    # shorten_url hands back the long URL when gplinks fails
+    complete = all(short_url != long_url for short_url, long_url in zip(short_urls, long_urls))
+    return file_list, complete
+
+async def render_search_page(cursor: SearchCursor, page: int) -> str:
+    # Shortened links for a page are computed once per (query, page) and shared by every user
+    key = (cursor.generation, cursor.key, page)
+    file_list = search_page_cache.get(key)
+    if file_list is None:
+        file_list, complete = await coalesce(search_page_requests, key, lambda: shorten_search_page(cursor, page))
+        # A page with fallback links is served as is but retried on the next view
+        if complete:
+            search_page_cache.set(key, file_list)
+    return file_list
+
+def prefetch_search_page(cursor: SearchCursor, page: int):
+    key = (cursor.generation, cursor.key, page)
+    if page <= cursor.total_pages and key not in search_page_requests and search_page_cache.get(key) is None:
+        task = asyncio.create_task(render_search_page(cursor, page))
+        search_page_prefetches.add(task)
+        task.add_done_callback(search_page_prefetches.discard)
+
+async def expire_caches():
+    while True:
+        await asyncio.sleep(CACHE_SWEEP_INTERVAL)
+        expired = search_cache.expire() + search_page_cache.expire() + subscription_cache.expire() + short_url_cache.expire()
+        idle = user_states.expire() + rate_limiter.sweep()
+        if expired or idle:
+            logger.info(f"Expired {expired} cache entries and {idle} idle user sessions")
+
+async def index_channel_post(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    message = update.effective_message
+    catalog = file_catalogs.get(message.chat_id)
+    entry = extract_file_entry(message, message.chat_id, message.message_id)
+    if catalog and entry and await catalog.insert(entry):
+        invalidate_search_cache()
+        await catalog.persist([entry])
+        logger.info(f"Indexed file '{entry['file_name']}' from channel {message.chat_id}")
+
+async def backfill_file_catalog(context: ContextTypes.DEFAULT_TYPE, chat_id: int, db_channel_id: int, first_id: int, last_id: int):
+    # Bots cannot read channel history, so each post is forwarded to a scratch chat, indexed and removed
+    scratch_chat_id = LOG_CHANNEL_ID if IS_LOGGING_ENABLED else chat_id
+    catalog = file_catalogs[db_channel_id]
+    indexed = []
+    message_id = first_id
+    while message_id <= last_id:
+        try:
+            forwarded = await dispatch(context.bot.forward_message, priority=PRIORITY_BROADCAST, chat_id=scratch_chat_id, from_chat_id=db_channel_id, message_id=message_id, disable_notification=True)
+        except RetryAfter as e:
+            await asyncio.sleep(e.retry_after)
+            continue
+        except TelegramError:
+            message_id += 1
+            continue
+        entry = extract_file_entry(forwarded, db_channel_id, message_id)
+        if entry and await catalog.insert(entry):
+            indexed.append(entry)
+        try:
+            await dispatch(context.bot.delete_message, priority=PRIORITY_DELETE, per_chat=False, chat_id=scratch_chat_id, message_id=forwarded.message_id)
+        except TelegramError as e:
+            logger.warning(f"Failed to delete forwarded message {forwarded.message_id}: {e}")
+        if len(indexed) >= INDEX_BATCH_LOG_EVERY:
+            await catalog.persist(indexed)
+            logger.info(f"Backfill progress: message {message_id}/{last_id}")
+            indexed = []
+        message_id += 1
+    if indexed:
+        await catalog.persist(indexed)
+    invalidate_search_cache()
+    await send_message_with_auto_delete(context, chat_id, LANGUAGES['index_done'].format(count=catalog_file_count()))
+    logger.info(f"Backfill of channel {db_channel_id} finished at message {last_id}")
+
+async def retry_with_backoff(operation, max_retries=3, initial_delay=1):
+    # `operation` builds a fresh awaitable per attempt; a coroutine cannot be awaited twice
     for attempt in range(max_retries):
         try:
             async with timeout(10):
-                return await coro
+                return await operation()
         except (TelegramError, asyncio.TimeoutError) as e:
             if attempt == max_retries - 1:
                 logger.error(f"Failed after {max_retries} retries: {e}")
                 raise
             delay = initial_delay * (2 ** attempt)
             logger.warning(f"Retry {attempt + 1}/{max_retries} after {delay}s: {e}")
-            await asyncio.sleep(delay)
+            with Span('retry_backoff'):
+                await asyncio.sleep(delay)
+
+# Broadcast engine
+class BroadcastJob:
+    def __init__(self, admin_id: str, chat_id: int, content: dict, targets: list, cursor: int = 0,
+                 success_count: int = 0, fail_count: int = 0, pruned_count: int = 0, progress_message_id: int = None):
+        self.admin_id = admin_id
+        self.chat_id = chat_id
+        self.content = content
+        self.targets = targets
+        self.cursor = cursor
+        self.success_count = success_count
+        self.fail_count = fail_count
+        self.pruned_count = pruned_count
+        self.progress_message_id = progress_message_id
+
+    def to_dict(self) -> dict:
+        # Targets are written once to BROADCAST_TARGETS_FILE; progress saves only carry the cursor
+        return {
+            'admin_id': self.admin_id,
+            'chat_id': self.chat_id,
+            'content': self.content,
+            'cursor': self.cursor,
+            'success_count': self.success_count,
+            'fail_count': self.fail_count,
+            'pruned_count': self.pruned_count,
+            'progress_message_id': self.progress_message_id
+        }
+
+    def progress_text(self) -> str:
+        return LANGUAGES['broadcast_progress'].format(
+            done=self.cursor,
+            total=len(self.targets),
+            success_count=self.success_count,
+            fail_count=self.fail_count,
+            pruned_count=self.pruned_count
+        )
+
+broadcast_job = None
+broadcast_writer = DebouncedWriter(BROADCAST_FILE, lambda: broadcast_job.to_dict() if broadcast_job else None, BROADCAST_PROGRESS_INTERVAL)
+
+def save_broadcast_targets(targets: list):
+    write_atomic(BROADCAST_TARGETS_FILE, json.dumps(targets, separators=(',', ':')))
+
+def remove_broadcast_targets():
+    try:
+        os.remove(BROADCAST_TARGETS_FILE)
+    except FileNotFoundError:
+        pass
+
+def load_broadcast_job():
+    try:
+        with open(BROADCAST_FILE, 'r') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return None
+    except json.JSONDecodeError as e:
+        logger.error(f"Invalid broadcast state in {BROADCAST_FILE}: {e}")
+        return None
+    if not data:
+        return None
+    try:
+        # Jobs saved before targets moved to their own file still carry them inline
+        if 'targets' not in data:
+            with open(BROADCAST_TARGETS_FILE, 'r') as f:
+                data['targets'] = json.load(f)
+        return BroadcastJob(**data)
+    except FileNotFoundError:
+        logger.error(f"{BROADCAST_TARGETS_FILE} not found, cannot resume broadcast")
+        return None
+    except (json.JSONDecodeError, TypeError) as e:
+        logger.error(f"Invalid broadcast state in {BROADCAST_FILE}: {e}")
+        return None
+
+async def send_broadcast_message(bot: Bot, job: BroadcastJob, target_user_id: int):
+    content = job.content
+    try:
+        if content['photo']:
+            await dispatch(bot.send_photo, priority=PRIORITY_BROADCAST, chat_id=target_user_id, photo=content['photo'], caption=content['text'])
+        elif content['video']:
+            await dispatch(bot.send_video, priority=PRIORITY_BROADCAST, chat_id=target_user_id, video=content['video'], caption=content['text'])
+        else:
+            await dispatch(bot.send_message, priority=PRIORITY_BROADCAST, chat_id=target_user_id, text=content['text'])
+        job.success_count += 1
+        broadcast_messages.inc('sent')
+    except Forbidden as e:
+        logger.info(f"Pruning user {target_user_id} from user list: {e}")
+        users.discard(target_user_id)
+        await save_users([], [target_user_id])
+        job.pruned_count += 1
+        job.fail_count += 1
+        broadcast_messages.inc('blocked')
+    except TelegramError as e:
+        logger.error(f"Failed to send broadcast to {target_user_id}: {e}")
+        job.fail_count += 1
+        broadcast_messages.inc('failed')
+
+async def report_broadcast_progress(bot: Bot, job: BroadcastJob):
+    last_text = None
+    while True:
+        await asyncio.sleep(BROADCAST_PROGRESS_INTERVAL)
+        text = job.progress_text()
+        if text == last_text:
+            continue
+        last_text = text
+        try:
+            await dispatch(bot.edit_message_text, chat_id=job.chat_id, message_id=job.progress_message_id, text=text)
+        except TelegramError as e:
+            logger.warning(f"Failed to update broadcast progress: {e}")
+
+async def run_broadcast(bot: Bot, job: BroadcastJob):
+    global broadcast_job
+    broadcast_job = job
+    next_index = job.cursor
+    finished = set()
+
+    async def worker():
+        nonlocal next_index
+        while next_index < len(job.targets):
+            index = next_index
+            next_index += 1
+            await send_broadcast_message(bot, job, job.targets[index])
+            # The persisted cursor only moves past a contiguous run of finished sends
+            finished.add(index)
+            while job.cursor in finished:
+                finished.remove(job.cursor)
+                job.cursor += 1
+            broadcast_writer.schedule()
+
+    logger.info(f"Broadcast by {job.admin_id} running from {job.cursor}/{len(job.targets)}")
+    if job.cursor == 0:
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, save_broadcast_targets, job.targets)
+        except OSError as e:
+            logger.error(f"Failed to save {BROADCAST_TARGETS_FILE}, this broadcast cannot be resumed: {e}")
+    # Saved right away, not after the first send, so a restart mid-broadcast finds the job
+    await broadcast_writer.write_now()
+    progress_task = asyncio.create_task(report_broadcast_progress(bot, job))
+    failed = resumable = False
+    try:
+        await asyncio.gather(*(worker() for _ in range(BROADCAST_WORKERS)))
+    except asyncio.CancelledError:
+        # Shutting down: keep the saved job so the next start resumes it
+        resumable = True
+        raise
+    except Exception as e:
+        failed = True
+        logger.error(f"Broadcast by {job.admin_id} stopped at {job.cursor}/{len(job.targets)}: {e}")
+    finally:
+        progress_task.cancel()
+        if not resumable:
+            broadcast_job = None
+        await broadcast_writer.flush()
+        if not resumable:
+            await asyncio.get_running_loop().run_in_executor(None, remove_broadcast_targets)
+    if failed:
+        return
+
+    message = LANGUAGES['broadcast_success'].format(
+        success_count=job.success_count,
+        fail_count=job.fail_count
+    )
+    try:
+        await dispatch(bot.edit_message_text, chat_id=job.chat_id, message_id=job.progress_message_id, text=f"{message} Removed (blocked): {job.pruned_count}.")
+    except TelegramError as e:
+        logger.warning(f"Failed to update broadcast progress: {e}")
+    if IS_LOGGING_ENABLED:
+        await send_log_message(f"Broadcast by {job.admin_id}: {message}\nContent: {job.content['text'][:100]}...")
+    logger.info(f"User {job.admin_id} completed broadcast: {job.success_count} succeeded, {job.fail_count} failed, {job.pruned_count} pruned")
+
+async def resume_broadcast(bot: Bot):
+    job = load_broadcast_job()
+    if job and job.cursor < len(job.targets):
+        logger.info(f"Resuming interrupted broadcast at {job.cursor}/{len(job.targets)}")
+        asyncio.create_task(run_broadcast(bot, job))
+
+# Update processing
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    # Updates run concurrently across chats but strictly one at a time within a chat
+    __slots__ = ('_chat_locks',)
+
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        self._chat_locks = {}
+
+    @staticmethod
+    def chat_key(update: object):
+        if isinstance(update, Update):
+            if update.effective_chat:
+                return update.effective_chat.id
+            if update.effective_user:
+                return update.effective_user.id
+        return None
+
+    async def _reclaim_slot(self) -> None:
+        # process_update releases a slot on the way out, so one must be held again even if the
+        # update is cancelled meanwhile; the cancellation is passed on once the slot is back
+        cancelled = False
+        while True:
+            try:
+                await self._semaphore.acquire()
+                break
+            except asyncio.CancelledError:
+                cancelled = True
+        if cancelled:
+            raise asyncio.CancelledError
+
+    async def do_process_update(self, update: object, coroutine) -> None:
+        key = self.chat_key(update)
+        if key is None:
+            await coroutine
+            return
+
+        entry = self._chat_locks.get(key)
+        if entry is None:
+            entry = self._chat_locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        holding = False
+        try:
+            # process_update (final in PTB) has already taken a slot. The chat's lock has to come
+            # first: waiting on it while holding a slot lets a burst from one chat fill every slot
+            # with updates blocked behind each other, and stalls all other chats. So the slot is
+            # given back for the wait and taken again once the chat's turn comes.
+            self._semaphore.release()
+            try:
+                # asyncio.Lock wakes waiters in arrival order, which keeps the chat's updates in order
+                await entry[0].acquire()
+                holding = True
+            finally:
+                await self._reclaim_slot()
+            await coroutine
+        finally:
+            if holding:
+                entry[0].release()
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._chat_locks[key]
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
 
 # Webhook handler
+webhook_queue = asyncio.Queue(maxsize=WEBHOOK_QUEUE_SIZE)
+webhook_stats = {'accepted': 0, 'rejected': 0, 'shed': 0}
+
 async def webhook(request):
-    update = Update.de_json(await request.json(), bot_app.bot)
-    if update:
-        await bot_app.process_update(update)
+    # Acknowledge as soon as the update is queued; handlers run on the worker pool
+    if WEBHOOK_SECRET and request.headers.get('X-Telegram-Bot-Api-Secret-Token') != WEBHOOK_SECRET:
+        return web.Response(status=403)
+    try:
+        data = await request.json()
+    except ValueError:
+        return web.Response(status=400)
+    if not isinstance(data, dict) or 'update_id' not in data:
+        return web.Response(status=400)
+    try:
+        webhook_queue.put_nowait(data)
+    except asyncio.QueueFull:
+        if WEBHOOK_OVERFLOW == 'shed':
+            webhook_stats['shed'] += 1
+            logger.warning(f"Webhook queue full, shedding update {data['update_id']}")
+            return web.Response(status=200)
+        webhook_stats['rejected'] += 1
+        logger.warning(f"Webhook queue full, rejecting update {data['update_id']}")
+        return web.Response(status=503, headers={'Retry-After': '1'})
+    webhook_stats['accepted'] += 1
     return web.Response(status=200)
 
+webhook_backlog = asyncio.Semaphore(WEBHOOK_QUEUE_SIZE)
+webhook_tasks = set()
+
+async def process_webhook_update(update: Update):
+    try:
+        await bot_app.update_processor.process_update(update, bot_app.process_update(update))
+    except Exception as e:
+        logger.error(f"Error processing update {update.update_id}: {e}")
+    finally:
+        webhook_backlog.release()
+
+async def webhook_worker():
+    # Hands each update to the processor as its own task, so a worker never waits behind a busy
+    # chat. The processor bounds running handlers; webhook_backlog bounds updates handed over.
+    while True:
+        data = await webhook_queue.get()
+        try:
+            update = Update.de_json(data, bot_app.bot)
+            if update:
+                await webhook_backlog.acquire()
+                task = asyncio.create_task(process_webhook_update(update))
+                webhook_tasks.add(task)
+                task.add_done_callback(webhook_tasks.discard)
+        except Exception as e:
+            logger.error(f"Error processing update {data.get('update_id')}: {e}")
+        finally:
+            webhook_queue.task_done()
+
 # Health check endpoint
 async def health_check(request):
-    return web.Response(text="Bot is running")
+    return web.Response(text=f"Bot is running\n"
+                             f"webhook_queue={webhook_queue.qsize()}/{WEBHOOK_QUEUE_SIZE} "
+                             f"accepted={webhook_stats['accepted']} rejected={webhook_stats['rejected']} shed={webhook_stats['shed']}")
+
+# Metrics endpoint
+Gauge('bot_webhook_updates_total', 'Webhook updates by queueing outcome',
+      lambda: {(result,): count for result, count in webhook_stats.items()}, ('result',), kind='counter')
+Gauge('bot_webhook_queue_size', 'Updates waiting for a webhook worker', lambda: webhook_queue.qsize())
+Gauge('bot_webhook_backlog', 'Webhook updates handed to the update processor and not yet finished', lambda: len(webhook_tasks))
+Gauge('bot_outbound_queue_size', 'Bot API calls waiting in the outbound dispatcher', lambda: len(outbox.queue) + len(outbox.delayed))
+Gauge('bot_pending_deletions', 'Messages scheduled for auto-delete', lambda: len(deletion_scheduler.heap))
+Gauge('bot_cache_entries', 'Entries held per in-memory cache', lambda: {
+    ('search',): len(search_cache),
+    ('search_page',): len(search_page_cache),
+    ('short_url',): len(short_url_cache),
+    ('subscription',): len(subscription_cache),
+}, ('cache',))
+Gauge('bot_user_sessions', 'Active user sessions', lambda: len(user_states))
+Gauge('bot_catalog_files', 'Files indexed across DB channels', catalog_file_count)
+Gauge('bot_users', 'Known bot users', lambda: len(users))
+
+async def metrics(request):
+    return web.Response(text=render_metrics(), content_type='text/plain', charset='utf-8')
 
 # Command handlers
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     chat_id = update.effective_chat.id
 
-    async with rate_limiters[user_id]:
-        if not await check_subscription(context, user_id, chat_id):
-            return
+    if not await check_rate_limit(context, user_id, chat_id):
+        return
+
+    if not await check_subscription(context, user_id, chat_id):
+        return
 
+    if user_id not in users:
         users.add(user_id)
-        save_users(users)
+        await save_users([user_id])
         logger.info(f"Added user {user_id} to user list")
 
-        start_param = context.args[0] if context.args else None
-        if start_param and start_param.startswith('season'):
-            season_key = f"season_{start_param.split('season')[1]}"
-            if season_key in season_data:
-                await send_season_info(update, context, season_key)
-            else:
-                await send_message_with_auto_delete(context, chat_id, LANGUAGES['season_not_found'])
-            return
-
-        keyboard = [[f"Season {i} 🎬"] for i in range(1, len(season_data) + 1)] + [['Help ❓'], ['Settings ⚙️']]
-        reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True, one_time_keyboard=True)
-        if settings['start_pic']:
-            await retry_with_backoff(context.bot.send_photo(
-                chat_id=chat_id,
-                photo=settings['start_pic'],
-                caption=LANGUAGES['welcome'],
-                reply_markup=reply_markup
-            ))
+    start_param = context.args[0] if context.args else None
+    if start_param and start_param.startswith('file_'):
+        await send_file(context, chat_id, user_id, start_param[len('file_'):])
+        return
+    if start_param and start_param.startswith('season'):
+        season_key = f"season_{start_param.split('season')[1]}"
+        if season_key in season_data:
+            await send_season_info(update, context, season_key)
         else:
-            await send_message_with_auto_delete(context, chat_id, LANGUAGES['welcome'], reply_markup=reply_markup)
-        logger.info(f"User {user_id} used /start")
+            await send_message_with_auto_delete(context, chat_id, LANGUAGES['season_not_found'])
+        return
+
+    await send_main_menu(context, chat_id)
+    logger.info(f"User {user_id} used /start")
+
+async def send_file(context: ContextTypes.DEFAULT_TYPE, chat_id: int, user_id: int, key: str):
+    # Served from the in-memory catalog by file_id, without touching the DB channel
+    entry = find_file(key)
+    if entry is None:
+        await send_message_with_auto_delete(context, chat_id, LANGUAGES['file_link_invalid'])
+        return
+    send, field = FILE_SENDERS.get(entry.get('kind'), FILE_SENDERS['document'])
+    try:
+        message = await retry_with_backoff(lambda: dispatch(getattr(context.bot, send), chat_id=chat_id,
+                                                    caption=entry['file_name'], **{field: entry['file_id']}))
+        deletion_scheduler.schedule(chat_id, message.message_id)
+        logger.info(f"User {user_id} received file '{entry['file_name']}' via deep link")
+    except TelegramError as e:
+        logger.error(f"Error sending file {key}: {e}")
+        await send_message_with_auto_delete(context, chat_id, f"{LANGUAGES['file_search_error']} {LANGUAGES['retry_error']}")
 
 async def episode(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     chat_id = update.effective_chat.id
 
-    async with rate_limiters[user_id]:
-        if not await check_subscription(context, user_id, chat_id):
+    if not await check_rate_limit(context, user_id, chat_id):
+        return
+
+    if not await check_subscription(context, user_id, chat_id):
+        return
+
+    loading = await dispatch(context.bot.send_message, chat_id=chat_id, text=LANGUAGES['loading'])
+    try:
+        if not context.args:
+            await send_message_with_auto_delete(context, chat_id, LANGUAGES['invalid_episode'])
             return
 
-        loading = await context.bot.send_message(chat_id=chat_id, text=LANGUAGES['loading'])
-        try:
-            if not context.args:
-                await send_message_with_auto_delete(context, chat_id, LANGUAGES['invalid_episode'])
-                return
-
-            episode_number = int(context.args[0])
-            if episode_number < 1 or episode_number > TOTAL_EPISODES:
-                await send_message_with_auto_delete(context, chat_id, LANGUAGES['invalid_episode'])
-                return
-
-            season_key, season_num, episode_url = find_episode(episode_number)
-            if not episode_url:
-                await send_message_with_auto_delete(context, chat_id, LANGUAGES['episode_not_found'])
-                return
-
-            short_url = await retry_with_backoff(shorten_url(episode_url, f"episode{episode_number}"))
-            caption = f"Episode {episode_number} (Season {season_num}) Link: {short_url}\n" \
-                      f"How to resolve: Follow the guide at https://t.me/+_SQNyZD8hns3NzY1\n" \
-                      f"Updates: {UPDATES_CHANNEL}"
-            if COVER_PHOTO_ID:
-                await retry_with_backoff(context.bot.send_photo(
-                    chat_id=chat_id,
-                    photo=COVER_PHOTO_ID,
-                    caption="Episode Cover 📷"
-                ))
-            await retry_with_backoff(context.bot.send_message(
+        if '-' in context.args[0]:
+            await send_episode_range(context, chat_id, user_id, context.args[0])
+            return
+
+        episode_number = int(context.args[0])
+        if episode_number < 1 or episode_number > TOTAL_EPISODES:
+            await send_message_with_auto_delete(context, chat_id, LANGUAGES['invalid_episode'])
+            return
+
+        season_key, season_num, episode_url = find_episode(episode_number)
+        if not episode_url:
+            await send_message_with_auto_delete(context, chat_id, LANGUAGES['episode_not_found'])
+            return
+
+        short_url = await retry_with_backoff(lambda: shorten_url(episode_url, f"episode{episode_number}"))
+        caption = f"Episode {episode_number} (Season {season_num}) Link: {short_url}\n" \
+                  f"How to resolve: Follow the guide at https://t.me/+_SQNyZD8hns3NzY1\n" \
+                  f"Updates: {UPDATES_CHANNEL}"
+        if COVER_PHOTO_ID:
+            await retry_with_backoff(lambda: dispatch(context.bot.send_photo,
                 chat_id=chat_id,
-                text=caption,
-                reply_markup=create_link_keyboard()
+                photo=COVER_PHOTO_ID,
+                caption="Episode Cover 📷"
             ))
-            logger.info(f"User {user_id} requested Episode {episode_number}")
-        except ValueError:
-            await send_message_with_auto_delete(context, chat_id, LANGUAGES['invalid_episode'])
-        except TelegramError as e:
-            logger.error(f"Error in episode command: {e}")
-            await send_message_with_auto_delete(context, chat_id, f"{LANGUAGES['file_search_error']} {LANGUAGES['retry_error']}")
-        finally:
-            await context.bot.delete_message(chat_id=chat_id, message_id=loading.message_id)
+        await retry_with_backoff(lambda: dispatch(context.bot.send_message,
+            chat_id=chat_id,
+            text=caption,
+            reply_markup=create_link_keyboard()
+        ))
+        logger.info(f"User {user_id} requested Episode {episode_number}")
+    except ValueError:
+        await send_message_with_auto_delete(context, chat_id, LANGUAGES['invalid_episode'])
+    except TelegramError as e:
+        logger.error(f"Error in episode command: {e}")
+        await send_message_with_auto_delete(context, chat_id, f"{LANGUAGES['file_search_error']} {LANGUAGES['retry_error']}")
+    finally:
+        await dispatch(context.bot.delete_message, per_chat=False, chat_id=chat_id, message_id=loading.message_id)
+
+async def send_episode_range(context: ContextTypes.DEFAULT_TYPE, chat_id: int, user_id: int, arg: str):
+    first, last = (int(part) for part in arg.split('-', 1))
+    if first < 1 or last > TOTAL_EPISODES or first > last:
+        await send_message_with_auto_delete(context, chat_id, LANGUAGES['invalid_episode'])
+        return
+    if last - first + 1 > MAX_EPISODE_RANGE:
+        await send_message_with_auto_delete(context, chat_id, LANGUAGES['episode_range_too_large'].format(limit=MAX_EPISODE_RANGE))
+        return
+
+    episodes = find_episode_range(first, last)
+    if not episodes:
+        await send_message_with_auto_delete(context, chat_id, LANGUAGES['episode_not_found'])
+        return
+
+    short_urls = await shorten_urls([(episode_url, f"episode{ep_num}") for ep_num, _, _, episode_url in episodes])
+    links = "\n".join(f"Episode {ep_num} (Season {season_num}): {short_url}"
+                      for (ep_num, _, season_num, _), short_url in zip(episodes, short_urls))
+    caption = f"Episodes {first}-{last} Links:\n{links}\n" \
+              f"How to resolve: Follow the guide at https://t.me/+_SQNyZD8hns3NzY1\n" \
+              f"Updates: {UPDATES_CHANNEL}"
+    if COVER_PHOTO_ID:
+        await retry_with_backoff(lambda: dispatch(context.bot.send_photo,
+            chat_id=chat_id,
+            photo=COVER_PHOTO_ID,
+            caption="Episode Cover 📷"
+        ))
+    await retry_with_backoff(lambda: dispatch(context.bot.send_message,
+        chat_id=chat_id,
+        text=caption,
+        reply_markup=create_link_keyboard()
+    ))
+    logger.info(f"User {user_id} requested Episodes {first}-{last}")
 
 async def clearhistory(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     chat_id = update.effective_chat.id
 
-    async with rate_limiters[user_id]:
-        user_states[user_id] = {
-            'last_action': None,
-            'last_season': None,
-            'search_results': [],
-            'search_page': 1,
-            'search_query': None,
-            'edit_state': None,
-            'awaiting_broadcast': False,
-            'broadcast_content': None
-        }
-        await send_message_with_auto_delete(context, chat_id, LANGUAGES['clearhistory'])
-        logger.info(f"User {user_id} cleared history")
+    if not await check_rate_limit(context, user_id, chat_id):
+        return
+
+    user_states.pop(user_id)
+    await send_message_with_auto_delete(context, chat_id, LANGUAGES['clearhistory'])
+    logger.info(f"User {user_id} cleared history")
 
 async def owner(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     chat_id = update.effective_chat.id
 
-    async with rate_limiters[user_id]:
-        if not await check_subscription(context, user_id, chat_id):
-            return
+    if not await check_rate_limit(context, user_id, chat_id):
+        return
+
+    if not await check_subscription(context, user_id, chat_id):
+        return
 
-        await send_message_with_auto_delete(context, chat_id, LANGUAGES['owner'])
-        logger.info(f"User {user_id} used /owner")
+    await send_message_with_auto_delete(context, chat_id, LANGUAGES['owner'])
+    logger.info(f"User {user_id} used /owner")
 
 async def mainchannel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     chat_id = update.effective_chat.id
 
-    async with rate_limiters[user_id]:
-        await send_message_with_auto_delete(context, chat_id, LANGUAGES['mainchannel'])
-        logger.info(f"User {user_id} used /mainchannel")
+    if not await check_rate_limit(context, user_id, chat_id):
+        return
+
+    await send_message_with_auto_delete(context, chat_id, LANGUAGES['mainchannel'])
+    logger.info(f"User {user_id} used /mainchannel")
 
 async def guide(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     chat_id = update.effective_chat.id
 
-    async with rate_limiters[user_id]:
-        await send_message_with_auto_delete(context, chat_id, LANGUAGES['guide'])
-        logger.info(f"User {user_id} used /guide")
+    if not await check_rate_limit(context, user_id, chat_id):
+        return
+
+    await send_message_with_auto_delete(context, chat_id, LANGUAGES['guide'])
+    logger.info(f"User {user_id} used /guide")
 
 async def cover(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = str(update.effective_user.id)
     chat_id = update.effective_chat.id
 
-    async with rate_limiters[user_id]:
-        if user_id not in ADMIN_USER_IDS:
-            await send_message_with_auto_delete(context, chat_id, LANGUAGES['not_allowed'])
-            logger.info(f"User {user_id} attempted /cover")
-            return
+    if not await check_rate_limit(context, user_id, chat_id):
+        return
+
+    if user_id not in ADMIN_USER_IDS:
+        await send_message_with_auto_delete(context, chat_id, LANGUAGES['not_allowed'])
+        logger.info(f"User {user_id} attempted /cover")
+        return
 
-        user_states[user_id]['awaiting_cover'] = True
-        await send_message_with_auto_delete(context, chat_id, LANGUAGES['cover_prompt'])
-        logger.info(f"User {user_id} initiated /cover")
+    user_states[user_id].awaiting_cover = True
+    await send_message_with_auto_delete(context, chat_id, LANGUAGES['cover_prompt'])
+    logger.info(f"User {user_id} initiated /cover")
 
 async def handle_cover_photo(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = str(update.effective_user.id)
     chat_id = update.effective_chat.id
 
-    if not user_states[user_id].get('awaiting_cover', False):
+    session = user_states.peek(user_id)
+    if not session or not session.awaiting_cover:
         return
 
-    async with rate_limiters[user_id]:
+    if not await check_rate_limit(context, user_id, chat_id):
+        return
+
+    if update.message.photo:
+        global COVER_PHOTO_ID
+        COVER_PHOTO_ID = update.message.photo[-1].file_id
+        settings['cover_pic'] = COVER_PHOTO_ID
+        save_settings(settings)
+        user_states[user_id].awaiting_cover = False
+        await send_message_with_auto_delete(context, chat_id, LANGUAGES['cover_set'])
+        logger.info(f"User {user_id} set cover photo")
+    else:
+        await send_message_with_auto_delete(context, chat_id, LANGUAGES['cover_invalid'])
+
+async def edit(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = str(update.effective_user.id)
+    chat_id = update.effective_chat.id
+
+    if not await check_rate_limit(context, user_id, chat_id):
+        return
+
+    if user_id not in ADMIN_USER_IDS:
+        await send_message_with_auto_delete(context, chat_id, LANGUAGES['not_allowed'])
+        logger.info(f"User {user_id} attempted /edit (not admin, ADMIN_USER_IDS={ADMIN_USER_IDS})")
+        return
+
+    user_states[user_id].edit_state = {'stage': 'menu'}
+    await send_message_with_auto_delete(context, chat_id, LANGUAGES['edit_menu'], reply_markup=create_edit_menu_keyboard())
+    logger.info(f"User {user_id} initiated /edit")
+
+async def handle_edit_actions(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = str(update.effective_user.id)
+    chat_id = update.effective_chat.id
+    session = user_states.peek(user_id)
+    edit_state = session.edit_state if session else None
+    if not edit_state:
+        return
+
+    if not await check_rate_limit(context, user_id, chat_id):
+        return
+
+    stage = edit_state.get('stage')
+    logger.info(f"User {user_id} in edit stage: {stage}")
+    if stage == 'start_text':
+        if update.message.text:
+            settings['start_text'] = update.message.text
+            LANGUAGES['welcome'] = settings['start_text']
+            save_settings(settings)
+            user_states[user_id].edit_state = {'stage': 'menu'}
+            await send_message_with_auto_delete(context, chat_id, LANGUAGES['edit_start_text_set'], reply_markup=create_edit_menu_keyboard())
+            logger.info(f"User {user_id} updated start text")
+        else:
+            await send_message_with_auto_delete(context, chat_id, "Please send text.")
+    elif stage == 'start_pic':
+        if update.message.photo:
+            settings['start_pic'] = update.message.photo[-1].file_id
+            save_settings(settings)
+            user_states[user_id].edit_state = {'stage': 'menu'}
+            await send_message_with_auto_delete(context, chat_id, LANGUAGES['edit_start_pic_set'], reply_markup=create_edit_menu_keyboard())
+            logger.info(f"User {user_id} updated start pic")
+        else:
+            await send_message_with_auto_delete(context, chat_id, LANGUAGES['edit_start_pic_invalid'])
+    elif stage == 'cover':
         if update.message.photo:
             global COVER_PHOTO_ID
             COVER_PHOTO_ID = update.message.photo[-1].file_id
             settings['cover_pic'] = COVER_PHOTO_ID
             save_settings(settings)
-            user_states[user_id]['awaiting_cover'] = False
-            await send_message_with_auto_delete(context, chat_id, LANGUAGES['cover_set'])
-            logger.info(f"User {user_id} set cover photo")
+            user_states[user_id].edit_state = {'stage': 'menu'}
+            await send_message_with_auto_delete(context, chat_id, LANGUAGES['edit_cover_set'], reply_markup=create_edit_menu_keyboard())
+            logger.info(f"User {user_id} updated cover photo")
         else:
-            await send_message_with_auto_delete(context, chat_id, LANGUAGES['cover_invalid'])
+            await send_message_with_auto_delete(context, chat_id, LANGUAGES['edit_cover_invalid'])
+    elif stage == 'link_content':
+        if update.message.text or update.message.photo or update.message.video:
+            edit_state['content'] = (update.message.text if update.message.text else
+                                    update.message.photo[-1].file_id if update.message.photo else
+                                    update.message.video.file_id)
+            edit_state['is_media'] = bool(update.message.photo or update.message.video)
+            edit_state['stage'] = 'confirm'
+            await send_message_with_auto_delete(context, chat_id, LANGUAGES['edit_link_confirm'], reply_markup=create_confirm_keyboard('link_save', edit_state['season_key']))
+            logger.info(f"User {user_id} provided link content for {edit_state['season_key']}")
+        else:
+            await send_message_with_auto_delete(context, chat_id, "Send text, photo, or video for the season link.")
 
-async def edit(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = str(update.effective_user.id)
     chat_id = update.effective_chat.id
 
-    async with rate_limiters[user_id]:
-        if user_id not in ADMIN_USER_IDS:
-            await send_message_with_auto_delete(context, chat_id, LANGUAGES['not_allowed'])
-            logger.info(f"User {user_id} attempted /edit (not admin, ADMIN_USER_IDS={ADMIN_USER_IDS})")
-            return
+    if not await check_rate_limit(context, user_id, chat_id):
+        return
 
-        user_states[user_id]['edit_state'] = {'stage': 'menu'}
-        await send_message_with_auto_delete(context, chat_id, LANGUAGES['edit_menu'], reply_markup=create_edit_menu_keyboard())
-        logger.info(f"User {user_id} initiated /edit")
+    if user_id not in ADMIN_USER_IDS:
+        await send_message_with_auto_delete(context, chat_id, LANGUAGES['not_allowed'])
+        logger.info(f"User {user_id} attempted /broadcast (not admin, ADMIN_USER_IDS={ADMIN_USER_IDS})")
+        return
 
-async def handle_edit_actions(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_states[user_id].awaiting_broadcast = True
+    await send_message_with_auto_delete(context, chat_id, LANGUAGES['broadcast_prompt'])
+    logger.info(f"User {user_id} initiated /broadcast")
+
+async def index(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = str(update.effective_user.id)
     chat_id = update.effective_chat.id
-    edit_state = user_states[user_id].get('edit_state')
-    if not edit_state:
+
+    if not await check_rate_limit(context, user_id, chat_id):
         return
 
-    async with rate_limiters[user_id]:
-        stage = edit_state.get('stage')
-        logger.info(f"User {user_id} in edit stage: {stage}")
-        if stage == 'start_text':
-            if update.message.text:
-                settings['start_text'] = update.message.text
-                LANGUAGES['welcome'] = settings['start_text']
-                save_settings(settings)
-                user_states[user_id]['edit_state'] = {'stage': 'menu'}
-                await send_message_with_auto_delete(context, chat_id, LANGUAGES['edit_start_text_set'], reply_markup=create_edit_menu_keyboard())
-                logger.info(f"User {user_id} updated start text")
-            else:
-                await send_message_with_auto_delete(context, chat_id, "Please send text.")
-        elif stage == 'start_pic':
-            if update.message.photo:
-                settings['start_pic'] = update.message.photo[-1].file_id
-                save_settings(settings)
-                user_states[user_id]['edit_state'] = {'stage': 'menu'}
-                await send_message_with_auto_delete(context, chat_id, LANGUAGES['edit_start_pic_set'], reply_markup=create_edit_menu_keyboard())
-                logger.info(f"User {user_id} updated start pic")
-            else:
-                await send_message_with_auto_delete(context, chat_id, LANGUAGES['edit_start_pic_invalid'])
-        elif stage == 'cover':
-            if update.message.photo:
-                global COVER_PHOTO_ID
-                COVER_PHOTO_ID = update.message.photo[-1].file_id
-                settings['cover_pic'] = COVER_PHOTO_ID
-                save_settings(settings)
-                user_states[user_id]['edit_state'] = {'stage': 'menu'}
-                await send_message_with_auto_delete(context, chat_id, LANGUAGES['edit_cover_set'], reply_markup=create_edit_menu_keyboard())
-                logger.info(f"User {user_id} updated cover photo")
-            else:
-                await send_message_with_auto_delete(context, chat_id, LANGUAGES['edit_cover_invalid'])
-        elif stage == 'link_content':
-            if update.message.text or update.message.photo or update.message.video:
-                edit_state['content'] = (update.message.text if update.message.text else
-                                        update.message.photo[-1].file_id if update.message.photo else
-                                        update.message.video.file_id)
-                edit_state['is_media'] = bool(update.message.photo or update.message.video)
-                edit_state['stage'] = 'confirm'
-                await send_message_with_auto_delete(context, chat_id, LANGUAGES['edit_link_confirm'], reply_markup=create_confirm_keyboard('link_save', edit_state['season_key']))
-                logger.info(f"User {user_id} provided link content for {edit_state['season_key']}")
-            else:
-                await send_message_with_auto_delete(context, chat_id, "Send text, photo, or video for the season link.")
+    if user_id not in ADMIN_USER_IDS:
+        await send_message_with_auto_delete(context, chat_id, LANGUAGES['not_allowed'])
+        logger.info(f"User {user_id} attempted /index (not admin, ADMIN_USER_IDS={ADMIN_USER_IDS})")
+        return
 
-async def broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    try:
+        last_id = int(context.args[0])
+        first_id = int(context.args[1]) if len(context.args) > 1 else 1
+        db_channel_id = int(context.args[2]) if len(context.args) > 2 else DB_CHANNELS[0]
+    except (IndexError, ValueError):
+        await send_message_with_auto_delete(context, chat_id, LANGUAGES['index_prompt'])
+        return
+    if db_channel_id not in file_catalogs:
+        await send_message_with_auto_delete(context, chat_id, LANGUAGES['index_unknown_channel'].format(channels=", ".join(map(str, DB_CHANNELS))))
+        return
+
+    await send_message_with_auto_delete(context, chat_id, LANGUAGES['index_started'].format(first=first_id, last=last_id))
+    asyncio.create_task(backfill_file_catalog(context, chat_id, db_channel_id, first_id, last_id))
+    logger.info(f"User {user_id} started /index for messages {first_id}-{last_id} of channel {db_channel_id}")
+
+async def profile(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = str(update.effective_user.id)
     chat_id = update.effective_chat.id
 
-    async with rate_limiters[user_id]:
-        if user_id not in ADMIN_USER_IDS:
-            await send_message_with_auto_delete(context, chat_id, LANGUAGES['not_allowed'])
-            logger.info(f"User {user_id} attempted /broadcast (not admin, ADMIN_USER_IDS={ADMIN_USER_IDS})")
-            return
+    if not await check_rate_limit(context, user_id, chat_id):
+        return
 
-        user_states[user_id]['awaiting_broadcast'] = True
-        await send_message_with_auto_delete(context, chat_id, LANGUAGES['broadcast_prompt'])
-        logger.info(f"User {user_id} initiated /broadcast")
+    if user_id not in ADMIN_USER_IDS:
+        await send_message_with_auto_delete(context, chat_id, LANGUAGES['not_allowed'])
+        logger.info(f"User {user_id} attempted /profile (not admin)")
+        return
+
+    action = context.args[0].lower() if context.args else None
+    if action == 'on':
+        path = profiler.start()
+        await send_message_with_auto_delete(context, chat_id, LANGUAGES['profile_started'].format(path=path))
+    elif action == 'off' and profiler.running:
+        path = await profiler.stop()
+        await send_message_with_auto_delete(context, chat_id, LANGUAGES['profile_stopped'].format(path=path))
+    else:
+        state = 'running' if profiler.running else 'off'
+        await send_message_with_auto_delete(context, chat_id, LANGUAGES['profile_status'].format(state=state))
+    logger.info(f"User {user_id} used /profile {action or ''}")
 
 async def handle_broadcast_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = str(update.effective_user.id)
     chat_id = update.effective_chat.id
 
-    if not user_states[user_id].get('awaiting_broadcast', False):
+    session = user_states.peek(user_id)
+    if not session or not session.awaiting_broadcast:
         return
 
-    async with rate_limiters[user_id]:
-        if update.message.text or update.message.photo or update.message.video:
-            content = update.message.text or update.message.caption or ""
-            photo = update.message.photo[-1].file_id if update.message.photo else None
-            video = update.message.video.file_id if update.message.video else None
-            user_states[user_id]['awaiting_broadcast'] = False
-            user_states[user_id]['broadcast_content'] = {
-                'text': content,
-                'photo': photo,
-                'video': video
-            }
-            preview = content if content else "Photo" if photo else "Video"
-            await send_message_with_auto_delete(
-                context,
-                chat_id,
-                LANGUAGES['broadcast_confirm'].format(user_count=len(users), content=preview),
-                reply_markup=create_broadcast_confirm_keyboard(preview)
-            )
-            logger.info(f"User {user_id} submitted broadcast content: {preview}")
-        else:
-            await send_message_with_auto_delete(context, chat_id, LANGUAGES['broadcast_invalid'])
+    if not await check_rate_limit(context, user_id, chat_id):
+        return
+
+    if update.message.text or update.message.photo or update.message.video:
+        content = update.message.text or update.message.caption or ""
+        photo = update.message.photo[-1].file_id if update.message.photo else None
+        video = update.message.video.file_id if update.message.video else None
+        user_states[user_id].awaiting_broadcast = False
+        user_states[user_id].broadcast_content = {
+            'text': content,
+            'photo': photo,
+            'video': video
+        }
+        preview = content if content else "Photo" if photo else "Video"
+        await send_message_with_auto_delete(
+            context,
+            chat_id,
+            LANGUAGES['broadcast_confirm'].format(user_count=len(users), content=preview),
+            reply_markup=create_broadcast_confirm_keyboard(preview)
+        )
+        logger.info(f"User {user_id} submitted broadcast content: {preview}")
+    else:
+        await send_message_with_auto_delete(context, chat_id, LANGUAGES['broadcast_invalid'])
 
 async def handle_broadcast_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
@@ -659,65 +2728,30 @@ async def handle_broadcast_confirm(update: Update, context: ContextTypes.DEFAULT
     user_id = str(update.effective_user.id)
     chat_id = update.effective_chat.id
 
-    async with rate_limiters[user_id]:
-        if user_id not in ADMIN_USER_IDS:
-            await send_message_with_auto_delete(context, chat_id, LANGUAGES['not_allowed'])
+    if user_id not in ADMIN_USER_IDS:
+        await send_message_with_auto_delete(context, chat_id, LANGUAGES['not_allowed'])
+        return
+
+    if query.data == 'confirm_broadcast':
+        broadcast_content = user_states[user_id].broadcast_content
+        if not broadcast_content:
+            await send_message_with_auto_delete(context, chat_id, "No broadcast content found.")
             return
 
-        if query.data == 'confirm_broadcast':
-            broadcast_content = user_states[user_id].get('broadcast_content')
-            if not broadcast_content:
-                await send_message_with_auto_delete(context, chat_id, "No broadcast content found.")
-                return
-
-            content = broadcast_content['text']
-            photo = broadcast_content['photo']
-            video = broadcast_content['video']
-            success_count = 0
-            fail_count = 0
-
-            logger.info(f"User {user_id} confirmed broadcast: {content[:50]}...")
-            for target_user_id in users:
-                async with broadcast_limiter:
-                    try:
-                        if photo:
-                            await context.bot.send_photo(
-                                chat_id=target_user_id,
-                                photo=photo,
-                                caption=content
-                            )
-                        elif video:
-                            await context.bot.send_video(
-                                chat_id=target_user_id,
-                                video=video,
-                                caption=content
-                            )
-                        else:
-                            await context.bot.send_message(
-                                chat_id=target_user_id,
-                                text=content
-                            )
-                        success_count += 1
-                    except TelegramError as e:
-                        logger.error(f"Failed to send broadcast to {target_user_id}: {e}")
-                        fail_count += 1
-
-            message = LANGUAGES['broadcast_success'].format(
-                success_count=success_count,
-                fail_count=fail_count
-            )
-            await send_message_with_auto_delete(context, chat_id, message)
-            if IS_LOGGING_ENABLED:
-                await log_bot.send_message(
-                    LOG_CHANNEL_ID,
-                    f"Broadcast by {user_id}: {message}\nContent: {content[:100]}..."
-                )
-            logger.info(f"User {user_id} completed broadcast: {success_count} succeeded, {fail_count} failed")
-            user_states[user_id]['broadcast_content'] = None
-        elif query.data == 'cancel_broadcast':
-            user_states[user_id]['broadcast_content'] = None
-            await send_message_with_auto_delete(context, chat_id, LANGUAGES['broadcast_cancelled'])
-            logger.info(f"User {user_id} cancelled broadcast")
+        if broadcast_job is not None:
+            await send_message_with_auto_delete(context, chat_id, LANGUAGES['broadcast_running'])
+            return
+
+        job = BroadcastJob(user_id, chat_id, broadcast_content, sorted(users))
+        progress_message = await dispatch(context.bot.send_message, chat_id=chat_id, text=job.progress_text())
+        job.progress_message_id = progress_message.message_id
+        user_states[user_id].broadcast_content = None
+        logger.info(f"User {user_id} confirmed broadcast: {broadcast_content['text'][:50]}...")
+        asyncio.create_task(run_broadcast(context.bot, job))
+    elif query.data == 'cancel_broadcast':
+        user_states[user_id].broadcast_content = None
+        await send_message_with_auto_delete(context, chat_id, LANGUAGES['broadcast_cancelled'])
+        logger.info(f"User {user_id} cancelled broadcast")
 
 async def edit_button(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
@@ -725,196 +2759,213 @@ async def edit_button(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = str(update.effective_user.id)
     chat_id = update.effective_chat.id
 
-    async with rate_limiters[user_id]:
-        if user_id not in ADMIN_USER_IDS:
-            await send_message_with_auto_delete(context, chat_id, LANGUAGES['not_allowed'])
-            logger.info(f"User {user_id} attempted edit button (not admin, ADMIN_USER_IDS={ADMIN_USER_IDS})")
-            return
+    if user_id not in ADMIN_USER_IDS:
+        await send_message_with_auto_delete(context, chat_id, LANGUAGES['not_allowed'])
+        logger.info(f"User {user_id} attempted edit button (not admin, ADMIN_USER_IDS={ADMIN_USER_IDS})")
+        return
 
-        if query.data == 'edit_start_text':
-            user_states[user_id]['edit_state'] = {'stage': 'start_text'}
-            await send_message_with_auto_delete(context, chat_id, LANGUAGES['edit_start_text_prompt'].format(current=settings['start_text']))
-            logger.info(f"User {user_id} selected edit_start_text")
-        elif query.data == 'edit_start_pic':
-            user_states[user_id]['edit_state'] = {'stage': 'start_pic'}
-            current = settings['start_pic'] or "None"
-            await send_message_with_auto_delete(context, chat_id, LANGUAGES['edit_start_pic_prompt'].format(current=current))
-            logger.info(f"User {user_id} selected edit_start_pic")
-        elif query.data == 'edit_cover':
-            user_states[user_id]['edit_state'] = {'stage': 'cover'}
-            current = settings['cover_pic'] or "None"
-            await send_message_with_auto_delete(context, chat_id, LANGUAGES['edit_cover_prompt'].format(current=current))
-            logger.info(f"User {user_id} selected edit_cover")
-        elif query.data == 'edit_link':
-            user_states[user_id]['edit_state'] = {'stage': 'select_season', 'type': 'link'}
-            await send_message_with_auto_delete(context, chat_id, LANGUAGES['select_season'], reply_markup=create_season_selection_keyboard('link'))
-            logger.info(f"User {user_id} selected edit_link")
-        elif query.data.startswith('link_season_'):
-            season_key = query.data.split('_', 2)[2]
-            if season_key not in season_data:
-                await send_message_with_auto_delete(context, chat_id, LANGUAGES['season_not_found'])
-                return
-            user_states[user_id]['edit_state'] = {
-                'stage': 'link_content',
-                'season_key': season_key,
-                'content': None,
-                'is_media': False,
-                'buttons': []
-            }
-            await send_message_with_auto_delete(context, chat_id, LANGUAGES['edit_link_content_prompt'])
-            logger.info(f"User {user_id} selected season {season_key} for link edit")
-        elif query.data.startswith('confirm_'):
-            action, data = query.data.split('_', 2)[1:3]
-            if action == 'link_save':
-                season_key = user_states[user_id]['edit_state']['season_key']
-                season_data[season_key].update({
-                    'content': user_states[user_id]['edit_state']['content'],
-                    'is_media': user_states[user_id]['edit_state']['is_media'],
-                    'buttons': user_states[user_id]['edit_state']['buttons']
-                })
-                settings['season_data'] = season_data
-                save_settings(settings)
-                user_states[user_id]['edit_state'] = {'stage': 'menu'}
-                await send_message_with_auto_delete(context, chat_id, LANGUAGES['edit_link_saved'], reply_markup=create_edit_menu_keyboard())
-                logger.info(f"User {user_id} saved link settings for {season_key}")
-        elif query.data == 'cancel':
-            user_states[user_id]['edit_state'] = {'stage': 'menu'}
-            await send_message_with_auto_delete(context, chat_id, LANGUAGES['cancel'], reply_markup=create_edit_menu_keyboard())
-            logger.info(f"User {user_id} cancelled edit")
+    if query.data == 'edit_start_text':
+        user_states[user_id].edit_state = {'stage': 'start_text'}
+        await send_message_with_auto_delete(context, chat_id, LANGUAGES['edit_start_text_prompt'].format(current=settings['start_text']))
+        logger.info(f"User {user_id} selected edit_start_text")
+    elif query.data == 'edit_start_pic':
+        user_states[user_id].edit_state = {'stage': 'start_pic'}
+        current = settings['start_pic'] or "None"
+        await send_message_with_auto_delete(context, chat_id, LANGUAGES['edit_start_pic_prompt'].format(current=current))
+        logger.info(f"User {user_id} selected edit_start_pic")
+    elif query.data == 'edit_cover':
+        user_states[user_id].edit_state = {'stage': 'cover'}
+        current = settings['cover_pic'] or "None"
+        await send_message_with_auto_delete(context, chat_id, LANGUAGES['edit_cover_prompt'].format(current=current))
+        logger.info(f"User {user_id} selected edit_cover")
+    elif query.data == 'edit_link':
+        user_states[user_id].edit_state = {'stage': 'select_season', 'type': 'link'}
+        await send_message_with_auto_delete(context, chat_id, LANGUAGES['select_season'], reply_markup=create_season_selection_keyboard('link'))
+        logger.info(f"User {user_id} selected edit_link")
+    elif query.data.startswith('link_season_'):
+        season_key = query.data.split('_', 2)[2]
+        if season_key not in season_data:
+            await send_message_with_auto_delete(context, chat_id, LANGUAGES['season_not_found'])
+            return
+        user_states[user_id].edit_state = {
+            'stage': 'link_content',
+            'season_key': season_key,
+            'content': None,
+            'is_media': False,
+            'buttons': []
+        }
+        await send_message_with_auto_delete(context, chat_id, LANGUAGES['edit_link_content_prompt'])
+        logger.info(f"User {user_id} selected season {season_key} for link edit")
+    elif query.data.startswith('confirm_'):
+        action, data = query.data.split('_', 2)[1:3]
+        if action == 'link_save':
+            season_key = user_states[user_id].edit_state['season_key']
+            season_data[season_key].update({
+                'content': user_states[user_id].edit_state['content'],
+                'is_media': user_states[user_id].edit_state['is_media'],
+                'buttons': user_states[user_id].edit_state['buttons']
+            })
+            settings['season_data'] = season_data
+            save_settings(settings, seasons=True)
+            episode_index.rebuild(season_data)
+            invalidate_render_cache()
+            user_states[user_id].edit_state = {'stage': 'menu'}
+            await send_message_with_auto_delete(context, chat_id, LANGUAGES['edit_link_saved'], reply_markup=create_edit_menu_keyboard())
+            logger.info(f"User {user_id} saved link settings for {season_key}")
+    elif query.data == 'cancel':
+        user_states[user_id].edit_state = {'stage': 'menu'}
+        await send_message_with_auto_delete(context, chat_id, LANGUAGES['cancel'], reply_markup=create_edit_menu_keyboard())
+        logger.info(f"User {user_id} cancelled edit")
 
 async def handle_selection(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     chat_id = update.effective_chat.id
     text = update.message.text.strip().lower()
 
-    async with rate_limiters[user_id]:
-        if not await check_subscription(context, user_id, chat_id):
-            return
+    if not await check_rate_limit(context, user_id, chat_id):
+        return
 
-        if text.startswith('season '):
-            try:
-                season_number = int(text.split(' ')[1])
-                if 1 <= season_number <= len(season_data):
-                    await send_season_info(update, context, f"season_{season_number}")
-                    user_states[user_id]['last_action'] = f"season_{season_number}"
-                else:
-                    await send_message_with_auto_delete(context, chat_id, LANGUAGES['invalid_season'])
-            except ValueError:
-                await send_message_with_auto_delete(context, chat_id, LANGUAGES['invalid_season'])
-            return
+    if not await check_subscription(context, user_id, chat_id):
+        return
 
-        if text == 'help':
-            await send_message_with_auto_delete(context, chat_id, LANGUAGES['help'])
-            logger.info(f"User {user_id} used /help")
-            return
-        elif text == 'settings':
-            await send_message_with_auto_delete(context, chat_id, "Use /edit to change settings (admin only).")
-            return
-        elif text == 'back':
-            keyboard = [[f"Season {i} 🎬"] for i in range(1, len(season_data) + 1)] + [['Help ❓'], ['Settings ⚙️']]
-            reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True, one_time_keyboard=True)
-            if settings['start_pic']:
-                await retry_with_backoff(context.bot.send_photo(
-                    chat_id=chat_id,
-                    photo=settings['start_pic'],
-                    caption=LANGUAGES['welcome'],
-                    reply_markup=reply_markup
-                ))
+    if text.startswith('season '):
+        try:
+            season_number = int(text.split(' ')[1])
+            if 1 <= season_number <= len(season_data):
+                await send_season_info(update, context, f"season_{season_number}")
+                user_states[user_id].last_action = f"season_{season_number}"
             else:
-                await send_message_with_auto_delete(context, chat_id, LANGUAGES['welcome'], reply_markup=reply_markup)
-            logger.info(f"User {user_id} returned to menu")
-            return
+                await send_message_with_auto_delete(context, chat_id, LANGUAGES['invalid_season'])
+        except ValueError:
+            await send_message_with_auto_delete(context, chat_id, LANGUAGES['invalid_season'])
+        return
 
-        if not IS_DB_ENABLED:
-            await send_message_with_auto_delete(context, chat_id, LANGUAGES['db_not_configured'])
+    if text == 'help':
+        await send_message_with_auto_delete(context, chat_id, LANGUAGES['help'])
+        logger.info(f"User {user_id} used /help")
+        return
+    elif text == 'settings':
+        await send_message_with_auto_delete(context, chat_id, "Use /edit to change settings (admin only).")
+        return
+    elif text == 'back':
+        await send_main_menu(context, chat_id)
+        logger.info(f"User {user_id} returned to menu")
+        return
+
+    if not IS_DB_ENABLED:
+        await send_message_with_auto_delete(context, chat_id, LANGUAGES['db_not_configured'])
+        return
+
+    await dispatch(context.bot.send_message, chat_id=chat_id, text=LANGUAGES['searching'])
+    loading = await dispatch(context.bot.send_message, chat_id=chat_id, text=LANGUAGES['loading'])
+    try:
+        file_infos = await retry_with_backoff(lambda: search_file_in_channel(context, text, user_id))
+        if not file_infos:
+            await send_message_with_auto_delete(context, chat_id, LANGUAGES['file_not_found'].format(query=text))
             return
 
-        await context.bot.send_message(chat_id=chat_id, text=LANGUAGES['searching'])
-        loading = await context.bot.send_message(chat_id=chat_id, text=LANGUAGES['loading'])
-        try:
-            file_infos = await retry_with_backoff(search_file_in_channel(context, text, user_id))
-            if not file_infos:
-                await send_message_with_auto_delete(context, chat_id, LANGUAGES['file_not_found'].format(query=text))
-                return
-
-            user_states[user_id]['search_results'] = file_infos
-            user_states[user_id]['search_query'] = text
-            user_states[user_id]['search_page'] = 1
-            await display_search_results(update, context, page=1)
-        except TelegramError as e:
-            logger.error(f"Error searching files: {e}")
-            await send_message_with_auto_delete(context, chat_id, LANGUAGES['file_search_error'])
-        finally:
-            await context.bot.delete_message(chat_id=chat_id, message_id=loading.message_id)
+        user_states[user_id].search_cursor = SearchCursor(text, file_infos)
+        user_states[user_id].search_page = 1
+        await display_search_results(update, context, page=1)
+    except TelegramError as e:
+        logger.error(f"Error searching files: {e}")
+        await send_message_with_auto_delete(context, chat_id, LANGUAGES['file_search_error'])
+    finally:
+        await dispatch(context.bot.delete_message, per_chat=False, chat_id=chat_id, message_id=loading.message_id)
 
 async def send_season_info(update: Update, context: ContextTypes.DEFAULT_TYPE, season_key: str):
     user_id = update.effective_user.id
     chat_id = update.effective_chat.id
 
-    async with rate_limiters[user_id]:
-        if not await check_subscription(context, user_id, chat_id):
-            return
+    if not await check_subscription(context, user_id, chat_id):
+        return
 
-        season_info = season_data.get(season_key)
-        if not season_info:
-            await send_message_with_auto_delete(context, chat_id, LANGUAGES['season_not_found'])
-            return
+    season_info = season_data.get(season_key)
+    if not season_info:
+        await send_message_with_auto_delete(context, chat_id, LANGUAGES['season_not_found'])
+        return
 
-        season_name = f"Season {season_key.split('_')[1]}"
-        keyboard = [
-            [InlineKeyboardButton(f"🎬 {season_name}", callback_data=f"info_{season_key}")],
-            [InlineKeyboardButton("🔗 Link-Shortner", callback_data=f"resolve_{season_key}")],
-            [InlineKeyboardButton("⬅️ Back to Menu", callback_data="back_to_menu")]
-        ] + season_info['buttons']
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        if season_info['is_media']:
-            if season_info['content'].endswith('.mp4'):
-                await retry_with_backoff(context.bot.send_video(chat_id=chat_id, video=season_info['content'], caption=f"{season_name}:", reply_markup=reply_markup))
-            else:
-                await retry_with_backoff(context.bot.send_photo(chat_id=chat_id, photo=season_info['content'], caption=f"{season_name}:", reply_markup=reply_markup))
+    season_name = season_display_name(season_key)
+    reply_markup = create_season_info_keyboard(season_key)
+    if season_info['is_media']:
+        if season_info['content'].endswith('.mp4'):
+            await retry_with_backoff(lambda: dispatch(context.bot.send_video, chat_id=chat_id, video=season_info['content'], caption=f"{season_name}:", reply_markup=reply_markup))
         else:
-            await send_message_with_auto_delete(context, chat_id, season_info['content'] or f"{season_name}:", reply_markup=reply_markup)
-        user_states[user_id]['last_season'] = season_key
-        logger.info(f"User {user_id} accessed {season_key}")
+            await retry_with_backoff(lambda: dispatch(context.bot.send_photo, chat_id=chat_id, photo=season_info['content'], caption=f"{season_name}:", reply_markup=reply_markup))
+    else:
+        await send_message_with_auto_delete(context, chat_id, season_info['content'] or f"{season_name}:", reply_markup=reply_markup)
+    user_states[user_id].last_season = season_key
+    logger.info(f"User {user_id} accessed {season_key}")
 
 async def display_search_results(update: Update, context: ContextTypes.DEFAULT_TYPE, page: int):
     user_id = update.effective_user.id
     chat_id = update.effective_chat.id
-    file_infos = user_states[user_id]['search_results']
-    query = user_states[user_id]['search_query']
-    total_files = len(file_infos)
-    total_pages = math.ceil(total_files / FILES_PER_PAGE)
-
-    async with rate_limiters[user_id]:
-        if page < 1 or page > total_pages:
-            return
-
-        user_states[user_id]['search_page'] = page
-        start_idx = (page - 1) * FILES_PER_PAGE
-        end_idx = min(start_idx + FILES_PER_PAGE, total_files)
-        page_files = file_infos[start_idx:end_idx]
+    cursor = user_states[user_id].search_cursor
+    if cursor is None:
+        return
+    total_pages = cursor.total_pages
 
-        file_list = []
-        for file_info in page_files:
-            file_id = file_info['file_id']
-            file_name = file_info['file_name']
-            start_link = f"https://t.me/Naruto_multilangbot?start=file_{file_id}"
-            short_url = await retry_with_backoff(shorten_url(start_link, f"file_{file_id}"))
-            file_list.append(f"- {file_name}: {short_url}")
+    if page < 1 or page > total_pages:
+        return
 
-        file_list_text = "\n".join(file_list)
-        message_text = LANGUAGES['multiple_files_found'].format(count=total_files, query=query, file_list=file_list_text)
-        caption = f"How to resolve: Follow the guide at https://t.me/+_SQNyZD8hns3NzY1\nUpdates: {UPDATES_CHANNEL}"
-        reply_markup = create_pagination_keyboard(page, total_pages)
+    user_states[user_id].search_page = page
+    file_list_text = await render_search_page(cursor, page)
+    # Shorten the next page while the user reads this one
+    prefetch_search_page(cursor, page + 1)
+
+    message_text = LANGUAGES['multiple_files_found'].format(count=cursor.total, query=cursor.query, file_list=file_list_text)
+    caption = f"How to resolve: Follow the guide at https://t.me/+_SQNyZD8hns3NzY1\nUpdates: {UPDATES_CHANNEL}"
+    reply_markup = create_pagination_keyboard(page, total_pages)
+
+    if COVER_PHOTO_ID:
+        await retry_with_backoff(lambda: dispatch(context.bot.send_photo,
+            chat_id=chat_id,
+            photo=COVER_PHOTO_ID,
+            caption="Search Results Cover 📷"
+        ))
+    await send_message_with_auto_delete(context, chat_id, f"{message_text}\n\n{caption}", reply_markup=reply_markup)
+    logger.info(f"User {user_id} viewed search page {page}/{total_pages} for '{cursor.query}'")
+
+def inline_file_result(file_info: dict):
+    kind, file_id, file_name = file_info['kind'], file_info['file_id'], file_info['file_name']
+    result_id = file_info['key']
+    if kind == 'video':
+        return InlineQueryResultCachedVideo(result_id, file_id, title=file_name)
+    if kind == 'audio':
+        return InlineQueryResultCachedAudio(result_id, file_id)
+    if kind == 'photo':
+        return InlineQueryResultCachedPhoto(result_id, file_id, title=file_name)
+    return InlineQueryResultCachedDocument(result_id, title=file_name, document_file_id=file_id)
+
+async def inline_search(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    inline_query = update.inline_query
+    user_id = inline_query.from_user.id
+    text = inline_query.query.strip()
+
+    if not rate_limiter.allow(user_id):
+        rate_limited.inc()
+        return
+    if not await check_subscription(context, user_id):
+        await dispatch(inline_query.answer, results=[], cache_time=0, is_personal=True,
+                       button=InlineQueryResultsButton(LANGUAGES['inline_not_subscribed'], start_parameter='subscribe'))
+        return
+    if not text or not IS_DB_ENABLED:
+        await dispatch(inline_query.answer, results=[], cache_time=INLINE_CACHE_TIME, is_personal=True)
+        return
 
-        if COVER_PHOTO_ID:
-            await retry_with_backoff(context.bot.send_photo(
-                chat_id=chat_id,
-                photo=COVER_PHOTO_ID,
-                caption="Search Results Cover 📷"
-            ))
-        await send_message_with_auto_delete(context, chat_id, f"{message_text}\n\n{caption}", reply_markup=reply_markup)
-        logger.info(f"User {user_id} viewed search page {page}/{total_pages} for '{query}'")
+    try:
+        offset = int(inline_query.offset or 0)
+    except ValueError:
+        offset = 0
+    file_infos = await search_file_in_channel(context, text, user_id)
+    page_files = file_infos[offset:offset + INLINE_RESULTS_PER_PAGE]
+    next_offset = offset + len(page_files)
+    # Answers are personal because results are gated on subscription; Telegram still caches them per user
+    await dispatch(inline_query.answer,
+                   results=[inline_file_result(file_info) for file_info in page_files],
+                   cache_time=INLINE_CACHE_TIME, is_personal=True,
+                   next_offset=str(next_offset) if next_offset < len(file_infos) else '')
+    logger.info(f"User {user_id} searched inline for '{text}' (offset {offset})")
 
 async def button(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
@@ -922,74 +2973,65 @@ async def button(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     chat_id = update.effective_chat.id
 
-    async with rate_limiters[user_id]:
-        if not await check_subscription(context, user_id, chat_id):
-            return
+    if not await check_rate_limit(context, user_id, chat_id):
+        return
 
-        try:
-            if query.data.startswith('info_'):
-                season_key = query.data.split('_', 1)[1]
-                await send_season_info(update, context, season_key)
-            elif query.data.startswith('resolve_'):
-                season_key = query.data.split('_', 1)[1]
-                season_info = season_data.get(season_key)
-                if season_info:
-                    long_url = season_info["start_id_ref"]
-                    short_url = await retry_with_backoff(shorten_url(long_url, season_key))
-                    season_name = f"Season {season_key.split('_')[1]}"
-                    caption = f"{season_name} Link: {short_url}\n" \
-                              f"How to resolve: Follow the guide at https://t.me/+_SQNyZD8hns3NzY1\n" \
-                              f"Updates: {UPDATES_CHANNEL}"
-                    reply_markup = InlineKeyboardMarkup(season_info['buttons'] + create_link_keyboard().inline_keyboard)
-                    if season_info['is_media']:
-                        if season_info['content'].endswith('.mp4'):
-                            await retry_with_backoff(context.bot.send_video(chat_id=chat_id, video=season_info['content'], caption=caption, reply_markup=reply_markup))
-                        else:
-                            await retry_with_backoff(context.bot.send_photo(chat_id=chat_id, photo=season_info['content'], caption=caption, reply_markup=reply_markup))
+    if not await check_subscription(context, user_id, chat_id):
+        return
+
+    try:
+        if query.data.startswith('info_'):
+            season_key = query.data.split('_', 1)[1]
+            await send_season_info(update, context, season_key)
+        elif query.data.startswith('resolve_'):
+            season_key = query.data.split('_', 1)[1]
+            season_info = season_data.get(season_key)
+            if season_info:
+                long_url = season_info["start_id_ref"]
+                short_url = await retry_with_backoff(lambda: shorten_url(long_url, season_key))
+                caption = f"{season_display_name(season_key)} Link: {short_url}\n" \
+                          f"How to resolve: Follow the guide at https://t.me/+_SQNyZD8hns3NzY1\n" \
+                          f"Updates: {UPDATES_CHANNEL}"
+                reply_markup = create_season_link_keyboard(season_key)
+                if season_info['is_media']:
+                    if season_info['content'].endswith('.mp4'):
+                        await retry_with_backoff(lambda: dispatch(context.bot.send_video, chat_id=chat_id, video=season_info['content'], caption=caption, reply_markup=reply_markup))
                     else:
-                        await send_message_with_auto_delete(context, chat_id, season_info['content'] or caption, reply_markup=reply_markup)
-            elif query.data.startswith('edit_') or query.data.startswith('confirm_') or query.data == 'cancel':
-                await edit_button(update, context)
-            elif query.data == 'confirm_broadcast' or query.data == 'cancel_broadcast':
-                await handle_broadcast_confirm(update, context)
-            elif query.data == 'prev_page':
-                current_page = user_states[user_id]['search_page']
-                if current_page > 1:
-                    await display_search_results(update, context, page=current_page - 1)
-            elif query.data == 'next_page':
-                current_page = user_states[user_id]['search_page']
-                total_files = len(user_states[user_id]['search_results'])
-                total_pages = math.ceil(total_files / FILES_PER_PAGE)
-                if current_page < total_pages:
-                    await display_search_results(update, context, page=current_page + 1)
-            elif query.data == 'refine_search':
-                user_states[user_id]['search_results'] = []
-                user_states[user_id]['search_query'] = None
-                user_states[user_id]['search_page'] = 1
-                await send_message_with_auto_delete(context, chat_id, LANGUAGES['refine_search'])
-            elif query.data == 'back_to_menu':
-                keyboard = [[f"Season {i} 🎬"] for i in range(1, len(season_data) + 1)] + [['Help ❓'], ['Settings ⚙️']]
-                reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True, one_time_keyboard=True)
-                if settings['start_pic']:
-                    await retry_with_backoff(context.bot.send_photo(
-                        chat_id=chat_id,
-                        photo=settings['start_pic'],
-                        caption=LANGUAGES['welcome'],
-                        reply_markup=reply_markup
-                    ))
+                        await retry_with_backoff(lambda: dispatch(context.bot.send_photo, chat_id=chat_id, photo=season_info['content'], caption=caption, reply_markup=reply_markup))
                 else:
-                    await send_message_with_auto_delete(context, chat_id, LANGUAGES['welcome'], reply_markup=reply_markup)
-            elif query.data == 'noop':
-                pass
-        except TelegramError as e:
-            logger.error(f"Error handling button: {e}")
-            await send_message_with_auto_delete(context, chat_id, f"{LANGUAGES['file_search_error']} {LANGUAGES['retry_error']}")
+                    await send_message_with_auto_delete(context, chat_id, season_info['content'] or caption, reply_markup=reply_markup)
+        elif query.data == 'confirm_broadcast' or query.data == 'cancel_broadcast':
+            await handle_broadcast_confirm(update, context)
+        elif query.data.startswith('edit_') or query.data.startswith('confirm_') or query.data == 'cancel':
+            await edit_button(update, context)
+        elif query.data == 'prev_page':
+            current_page = user_states[user_id].search_page
+            if current_page > 1:
+                await display_search_results(update, context, page=current_page - 1)
+        elif query.data == 'next_page':
+            current_page = user_states[user_id].search_page
+            cursor = user_states[user_id].search_cursor
+            if cursor is not None and current_page < cursor.total_pages:
+                await display_search_results(update, context, page=current_page + 1)
+        elif query.data == 'refine_search':
+            user_states[user_id].search_cursor = None
+            user_states[user_id].search_page = 1
+            await send_message_with_auto_delete(context, chat_id, LANGUAGES['refine_search'])
+        elif query.data == 'back_to_menu':
+            await send_main_menu(context, chat_id)
+        elif query.data == 'noop':
+            pass
+    except TelegramError as e:
+        logger.error(f"Error handling button: {e}")
+        await send_message_with_auto_delete(context, chat_id, f"{LANGUAGES['file_search_error']} {LANGUAGES['retry_error']}")
 
 # Global bot application
 bot_app = None
 
 async def main():
     global bot_app
+    # Deploys stop the bot with SIGTERM; cancelling main lets the finally block below flush state
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
     try:
         # Validate environment
         if 'YOUR_BOT_TOKEN' in BOT_TOKEN:
@@ -1014,13 +3056,26 @@ async def main():
             logger.error("Invalid SEARCH_RESULT_LIMIT")
             sys.exit(1)
 
+        if WEBHOOK_WORKERS <= 0 or WEBHOOK_QUEUE_SIZE <= 0 or WEBHOOK_OVERFLOW not in ('reject', 'shed'):
+            logger.error("Invalid WEBHOOK_WORKERS, WEBHOOK_QUEUE_SIZE or WEBHOOK_OVERFLOW")
+            sys.exit(1)
+        if SEARCH_MODE not in ('ranked', 'substring'):
+            logger.error("Invalid SEARCH_MODE")
+            sys.exit(1)
+        if UPDATE_CONCURRENCY <= 0:
+            logger.error("Invalid UPDATE_CONCURRENCY")
+            sys.exit(1)
+
         logger.info(f"Bot configuration: SEARCH_TIMEOUT={SEARCH_TIMEOUT}s, TOTAL_EPISODES={TOTAL_EPISODES}, EPISODES_PER_SEASON={EPISODES_PER_SEASON}, SEARCH_RESULT_LIMIT={SEARCH_RESULT_LIMIT}")
 
+        get_http_session()
+
         # Start HTTP server for webhooks and health checks
         app = web.Application()
         app.add_routes([
             web.post('/', webhook),
-            web.get('/health', health_check)
+            web.get('/health', health_check),
+            web.get('/metrics', metrics)
         ])
         runner = web.AppRunner(app)
         await runner.setup()
@@ -1029,42 +3084,58 @@ async def main():
         logger.info(f"HTTP server started on port {PORT}")
 
         # Initialize Telegram bot
-        bot_app = Application.builder().token(BOT_TOKEN).build()
-
-        bot_app.add_handler(CommandHandler('start', start))
-        bot_app.add_handler(CommandHandler('episode', episode))
-        bot_app.add_handler(CommandHandler('clearhistory', clearhistory))
-        bot_app.add_handler(CommandHandler('owner', owner))
-        bot_app.add_handler(CommandHandler('mainchannel', mainchannel))
-        bot_app.add_handler(CommandHandler('guide', guide))
-        bot_app.add_handler(CommandHandler('cover', cover))
-        bot_app.add_handler(CommandHandler('edit', edit))
-        bot_app.add_handler(CommandHandler('broadcast', broadcast))
-        bot_app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_selection))
-        bot_app.add_handler(MessageHandler(filters.PHOTO & ~filters.COMMAND, handle_cover_photo))
-        bot_app.add_handler(MessageHandler((filters.TEXT | filters.PHOTO | filters.VIDEO) & ~filters.COMMAND, handle_broadcast_message))
-        bot_app.add_handler(CallbackQueryHandler(button))
+        bot_app = Application.builder().token(BOT_TOKEN).base_url(TELEGRAM_API_URL).concurrent_updates(ChatOrderedUpdateProcessor(UPDATE_CONCURRENCY)).build()
+
+        bot_app.add_handler(MessageHandler(
+            filters.UpdateType.CHANNEL_POSTS & filters.Chat(DB_CHANNELS) &
+            (filters.Document.ALL | filters.VIDEO | filters.AUDIO | filters.PHOTO),
+            instrumented(index_channel_post)
+        ))
+        bot_app.add_handler(ChatMemberHandler(instrumented(track_subscription), ChatMemberHandler.CHAT_MEMBER))
+        bot_app.add_handler(CommandHandler('start', instrumented(start)))
+        bot_app.add_handler(CommandHandler('episode', instrumented(episode)))
+        bot_app.add_handler(CommandHandler('clearhistory', instrumented(clearhistory)))
+        bot_app.add_handler(CommandHandler('owner', instrumented(owner)))
+        bot_app.add_handler(CommandHandler('mainchannel', instrumented(mainchannel)))
+        bot_app.add_handler(CommandHandler('guide', instrumented(guide)))
+        bot_app.add_handler(CommandHandler('cover', instrumented(cover)))
+        bot_app.add_handler(CommandHandler('edit', instrumented(edit)))
+        bot_app.add_handler(CommandHandler('broadcast', instrumented(broadcast)))
+        bot_app.add_handler(CommandHandler('index', instrumented(index)))
+        bot_app.add_handler(CommandHandler('profile', instrumented(profile)))
+        bot_app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, instrumented(handle_selection)))
+        bot_app.add_handler(MessageHandler(filters.PHOTO & ~filters.COMMAND, instrumented(handle_cover_photo)))
+        bot_app.add_handler(MessageHandler((filters.TEXT | filters.PHOTO | filters.VIDEO) & ~filters.COMMAND, instrumented(handle_broadcast_message)))
+        bot_app.add_handler(CallbackQueryHandler(instrumented(button)))
+        bot_app.add_handler(InlineQueryHandler(instrumented(inline_search)))
 
         await bot_app.initialize()
         await bot_app.start()
+        await resume_broadcast(bot_app.bot)
+        deletion_scheduler.start(bot_app.bot)
+        asyncio.create_task(expire_caches())
+        if PROFILE_ENABLED:
+            profiler.start()
 
         # Configure webhook or polling
         if WEBHOOK_URL:
             webhook_path = f"{WEBHOOK_URL}/"
+            for _ in range(WEBHOOK_WORKERS):
+                asyncio.create_task(webhook_worker())
             try:
-                await bot_app.bot.set_webhook(webhook_path)
+                await bot_app.bot.set_webhook(webhook_path, allowed_updates=Update.ALL_TYPES, secret_token=WEBHOOK_SECRET or None)
                 logger.info(f"Running in webhook mode: {webhook_path}")
                 if IS_LOGGING_ENABLED:
-                    await log_bot.send_message(LOG_CHANNEL_ID, f"Bot started in webhook mode: {webhook_path}")
+                    await send_log_message(f"Bot started in webhook mode: {webhook_path}")
             except TelegramError as e:
                 logger.error(f"Failed to set webhook: {e}")
                 if IS_LOGGING_ENABLED:
-                    await log_bot.send_message(LOG_CHANNEL_ID, f"Failed to set webhook: {e}")
+                    await send_log_message(f"Failed to set webhook: {e}")
                 sys.exit(1)
         else:
             logger.warning("WEBHOOK_URL not set, falling back to polling mode")
             if IS_LOGGING_ENABLED:
-                await log_bot.send_message(LOG_CHANNEL_ID, "WEBHOOK_URL not set, bot running in polling mode")
+                await send_log_message("WEBHOOK_URL not set, bot running in polling mode")
             await bot_app.updater.start_polling(allowed_updates=Update.ALL_TYPES)
             logger.info("Running in polling mode")
 
@@ -1077,8 +3148,19 @@ async def main():
     except Exception as e:
         logger.error(f"Error in main: {e}")
         if IS_LOGGING_ENABLED:
-            await log_bot.send_message(LOG_CHANNEL_ID, f"Critical error: {e}")
+            await send_log_message(f"Critical error: {e}")
         sys.exit(1)
+    finally:
+        await profiler.stop()
+        await short_url_cache_writer.flush()
+        await deletion_scheduler.flush()
+        await settings_repository.flush()
+        await close_http_session()
+        search_executor.shutdown(wait=False, cancel_futures=True)
+        index_executor.shutdown(wait=False)
 
 if __name__ == '__main__':
-    asyncio.run(main())
+    try:
+        asyncio.run(main())
+    except asyncio.CancelledError:
+        logger.info("Bot stopped")